@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+"""
+Benchmark 1x1 tiling of user areas (rw_areas sync).
+
+Compares, on the same AOI corpus:
+- the full scan over every extent tile against the grid index used to tile
+  user areas, reported as extent tiles resolved per second
+- the per-geostore and the vectorized (shapely 2) tiling backends, reported as
+  geostores tiled per second, checking both produce identical rows
+- geometry repair with the double buffer against make_valid, which only buffers
+  geometries with gaps or thin holes, reported as geometries per second with the
+  largest area difference between both paths
+- vertex counts before and after simplifying geometries over the vertex budget
+  (--max-vertices, RW_AREAS_MAX_VERTICES), with the largest shift compared to a
+  30 m pixel and the 30 m pixels whose centers moved in or out of the AOI
+- tiled rows at full precision against the same rows snapped to a precision grid
+  with set_precision, reported as vertices and WKB size, with a validation of the
+  zonal statistics on a sample of AOIs: the 30 m pixels whose centers fall in the
+  tiled AOI, compared between both
+
+Usage:
+    python scripts/benchmark_tiling.py [--geostores find_by_ids.json] [--extent extent_1x1.geojson]
+        [--max-vertices 100000] [--grid-size 1e-6] [--max-pixels 1000000]
+
+--geostores takes a saved response of /v2/geostore/find-by-ids, --extent a local
+copy of geotrellis/features/extent_1x1.geojson. Without them, a synthetic corpus
+and a synthetic global 1x1 grid are used. The zonal statistics are only compared
+for AOIs covering at most --max-pixels pixels.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+os.environ.setdefault("S3_BUCKET_PIPELINE", "gfw-pipelines-benchmark")
+os.environ.setdefault("S3_BUCKET_DATA_LAKE", "gfw-data-lake-benchmark")
+
+import numpy as np  # noqa: E402
+import shapely  # noqa: E402
+from datapump.sync import rw_areas  # noqa: E402
+from shapely.geometry import MultiPolygon, Polygon, box, mapping, shape  # noqa: E402
+from shapely.wkb import loads  # noqa: E402
+
+PIXEL_SIZE = 0.00025
+
+
+def load_extent(path: str) -> List[Tuple[Polygon, bool, bool]]:
+    if not path:
+        return [
+            (box(x, y, x + 1, y + 1), True, -30 <= y < 30)
+            for y in range(80, -60, -1)
+            for x in range(-180, 180)
+        ]
+
+    with open(path) as f:
+        features = json.load(f)["features"]
+
+    return [
+        (shape(f["geometry"]), f["properties"]["tcl"], f["properties"]["glad"])
+        for f in features
+    ]
+
+
+def load_geostores(path: str, count: int) -> List[Dict[str, Any]]:
+    if path:
+        with open(path) as f:
+            return json.load(f)["data"]
+
+    rand = random.Random(42)
+    geostores = []
+    for i in range(count):
+        x, y = rand.uniform(-170, 170), rand.uniform(-50, 70)
+        size = rand.choice([0.05, 0.2, 1.0, 3.0])
+        if i % 10 == 5:
+            geom = get_repair_case(i // 10, x, y, size)
+        elif i % 50 == 0:
+            # densely digitized AOI, over the vertex budget
+            angles = [2 * math.pi * j / 120_000 for j in range(120_000)]
+            geom = Polygon(
+                [(x + 0.05 * math.cos(a), y + 0.05 * math.sin(a)) for a in angles]
+            )
+        else:
+            geom = box(x, y, x + size, y + size)
+        geostores.append(
+            {
+                "geostoreId": f"{i:032x}",
+                "geostore": {
+                    "data": {
+                        "attributes": {
+                            "geojson": {"features": [{"geometry": mapping(geom)}]}
+                        }
+                    }
+                },
+            }
+        )
+    return geostores
+
+
+def get_repair_case(i: int, x: float, y: float, size: float) -> Any:
+    """
+    Invalid or sliver geometries user areas are repaired from
+    """
+    case = ["bowtie", "thin_hole", "narrow_gap", "islands"][i % 4]
+    if case == "bowtie":
+        return Polygon([(x, y), (x + size, y + size), (x + size, y), (x, y + size)])
+    elif case == "thin_hole":
+        return box(x, y, x + size, y + size).difference(
+            box(x + size / 4, y + size / 2, x + size * 3 / 4, y + size / 2 + 0.00001)
+        )
+    elif case == "narrow_gap":
+        return MultiPolygon(
+            [
+                box(x, y, x + size / 2, y + size),
+                box(x + size / 2 + 0.00005, y, x + size, y + size),
+            ]
+        )
+
+    return MultiPolygon(
+        [
+            box(x, y, x + size / 3, y + size),
+            box(x + size * 2 / 3, y, x + size, y + size),
+        ]
+    )
+
+
+def get_geometry(geostore: Dict[str, Any]):
+    return shape(
+        geostore["geostore"]["data"]["attributes"]["geojson"]["features"][0]["geometry"]
+    )
+
+
+def full_scan(geom, extent_1x1, _tile_index):
+    return [tile for tile in extent_1x1 if geom.intersects(tile[0])]
+
+
+def run_lookup(
+    name: str,
+    find_tiles: Callable,
+    geoms: List[Any],
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+) -> List[List[Tuple[Polygon, bool, bool]]]:
+    start = time.perf_counter()
+    results = [find_tiles(geom, extent_1x1, tile_index) for geom in geoms]
+    elapsed = time.perf_counter() - start
+
+    resolved = len(geoms) * len(extent_1x1)
+    print(
+        f"{name:>10}: {elapsed:8.3f}s  {resolved / elapsed:14,.0f} tiles/s  "
+        f"({sum(len(r) for r in results)} intersecting tiles)"
+    )
+    return results
+
+
+def run_backend(
+    name: str,
+    vectorized: bool,
+    geostores: List[Dict[str, Any]],
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+) -> List[Tuple[List[str], Any]]:
+    start = time.perf_counter()
+    results = rw_areas._tile_geostores(
+        geostores, extent_1x1, tile_index, vectorized=vectorized
+    )
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{name:>10}: {elapsed:8.3f}s  {len(geostores) / elapsed:14,.1f} geostores/s  "
+        f"({sum(len(rows) for rows, _ in results)} rows)"
+    )
+    return results
+
+
+def run_repair(geoms: List[Any]) -> None:
+    invalid = sum(not geom.is_valid for geom in geoms)
+    slivers = sum(geom.is_valid and rw_areas._has_slivers(geom) for geom in geoms)
+    print(f"{invalid} invalid geometries, {slivers} with slivers")
+    results = {}
+    for name, repair in [
+        ("buffer", rw_areas._buffer_geometry),
+        ("make_valid", rw_areas._repair_geometry),
+    ]:
+        start = time.perf_counter()
+        results[name] = [repair(geom) for geom in geoms]
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>10}: {elapsed:8.3f}s  {len(geoms) / elapsed:14,.1f} geometries/s"
+        )
+
+    pixel_area = 0.00025**2
+    differences = [
+        buffered.symmetric_difference(repaired).area / pixel_area
+        for buffered, repaired in zip(results["buffer"], results["make_valid"])
+        if buffered is not None and repaired is not None
+    ]
+    print(f"Largest area difference {max(differences, default=0):.2f} pixels")
+
+
+def run_simplification(geoms: List[Any], max_pixels: int) -> None:
+    for i, geom in enumerate(geoms):
+        start = time.perf_counter()
+        simplified = rw_areas._simplify_geometry(geom, str(i))
+        elapsed = time.perf_counter() - start
+        if simplified is geom:
+            continue
+
+        shift = geom.hausdorff_distance(simplified)
+        pixels = changed = "-"
+        if rw_areas.VECTORIZED_TILING_AVAILABLE:
+            geom_pixels = get_pixels([geom], max_pixels)
+            simplified_pixels = get_pixels([simplified], max_pixels)
+            if geom_pixels is not None and simplified_pixels is not None:
+                pixels = str(len(geom_pixels))
+                changed = str(len(np.setxor1d(geom_pixels, simplified_pixels)))
+        print(
+            f"{i:>10}: {elapsed:8.3f}s  {rw_areas._get_vertex_count(geom):>9} -> "
+            f"{rw_areas._get_vertex_count(simplified):>9} vertices, "
+            f"max shift {shift / PIXEL_SIZE:.2f} pixels, "
+            f"zonal statistics changed by {changed} of {pixels} pixels"
+        )
+
+
+def get_pixels(polygons: List[Any], max_pixels: int) -> Any:
+    """
+    Indices of the 30 m pixels whose centers fall in the polygons of an AOI, the
+    pixels a zonal statistic sums over. Returns None if the AOI covers too many
+    pixels.
+    """
+    if not polygons:
+        return np.empty(0, dtype=np.int64)
+
+    min_x, min_y, max_x, max_y = shapely.total_bounds(polygons)
+    cols = np.arange(np.floor(min_x / PIXEL_SIZE), np.ceil(max_x / PIXEL_SIZE))
+    lines = np.arange(np.floor(min_y / PIXEL_SIZE), np.ceil(max_y / PIXEL_SIZE))
+    if len(cols) * len(lines) > max_pixels:
+        return None
+
+    cols, lines = np.meshgrid(cols.astype(np.int64), lines.astype(np.int64))
+    xs, ys = get_pixel_centers(cols, lines)
+    inside = np.zeros(xs.shape, dtype=bool)
+    for polygon in polygons:
+        inside |= shapely.contains_xy(polygon, xs, ys)
+
+    return np.unique((lines[inside] + 360_000) * 1_440_000 + cols[inside] + 720_000)
+
+
+def get_polygons(rows: List[str]) -> List[Any]:
+    return [loads(row.split("\t")[1], hex=True) for row in rows]
+
+
+def get_pixel_centers(cols: Any, lines: Any) -> Tuple[Any, Any]:
+    return (cols + 0.5) * PIXEL_SIZE, (lines + 0.5) * PIXEL_SIZE
+
+
+def snap_rows(rows: List[str], grid_size: float) -> List[str]:
+    snapped_rows = []
+    for row in rows:
+        geostore_id, geom, fields = row.split("\t", 2)
+        polygon = shapely.set_precision(loads(geom, hex=True), grid_size)
+        if not polygon.is_empty:
+            snapped_rows.append(
+                f"{geostore_id}\t{shapely.to_wkb(polygon, hex=True)}\t{fields}"
+            )
+    return snapped_rows
+
+
+def run_precision_grid(
+    grid_size: float,
+    max_pixels: int,
+    geostores: List[Dict[str, Any]],
+    tiled: List[Tuple[List[str], Any]],
+) -> None:
+    start = time.perf_counter()
+    results = {
+        "full": tiled,
+        f"grid {grid_size:g}": [
+            (snap_rows(rows, grid_size), error_id) for rows, error_id in tiled
+        ],
+    }
+    print(f"Snapped rows in {time.perf_counter() - start:.3f}s")
+
+    for name, tiled_geostores in results.items():
+        polygons = [
+            loads(row.split("\t")[1], hex=True)
+            for rows, _ in tiled_geostores
+            for row in rows
+        ]
+        vertices = sum(rw_areas._get_vertex_count(polygon) for polygon in polygons)
+        size = sum(len(polygon.wkb) for polygon in polygons)
+        print(f"{name:>10}: {vertices:>10,} vertices  {size:>12,} WKB bytes")
+
+    # snapping moves the boundary by up to half a grid cell diagonal, so only pixels
+    # with their center that close to the boundary can change
+    full, snapped = results.values()
+    compared = changed = pixels = changed_pixels = 0
+    max_distance = 0.0
+    for geostore, (full_rows, _), (snapped_rows, _) in zip(geostores, full, snapped):
+        full_pixels = get_pixels(get_polygons(full_rows), max_pixels)
+        snapped_pixels = get_pixels(get_polygons(snapped_rows), max_pixels)
+        if full_pixels is None or snapped_pixels is None:
+            continue
+
+        compared += 1
+        pixels += len(full_pixels)
+        differences = np.setxor1d(full_pixels, snapped_pixels)
+        if not len(differences):
+            continue
+
+        changed += 1
+        changed_pixels += len(differences)
+        lines, cols = np.divmod(differences, 1_440_000)
+        xs, ys = get_pixel_centers(cols - 720_000, lines - 360_000)
+        boundary = shapely.union_all(
+            [loads(row.split("\t")[1], hex=True) for row in full_rows]
+        ).boundary
+        distance = shapely.distance(boundary, shapely.points(xs, ys)).max()
+        max_distance = max(max_distance, distance)
+        print(
+            f"Zonal statistics of geostore {geostore['geostoreId']} changed by "
+            f"{len(differences)} of {len(full_pixels)} pixels, with centers up to "
+            f"{distance / grid_size:.2f} grid cells from the boundary"
+        )
+
+    print(
+        f"Zonal statistics compared on {compared} of {len(geostores)} AOIs: {changed} "
+        f"changed by {changed_pixels} of {pixels} pixels, all with centers within "
+        f"{max_distance / grid_size:.2f} grid cells of the boundary"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--geostores", default="")
+    parser.add_argument("--extent", default="")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--max-vertices", type=int, default=100_000)
+    parser.add_argument("--grid-size", type=float, default=1e-6)
+    parser.add_argument("--max-pixels", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    extent_1x1 = load_extent(args.extent)
+    geostores = load_geostores(args.geostores, args.count)
+    geoms = [get_geometry(g) for g in geostores]
+    print(f"{len(geoms)} AOIs against {len(extent_1x1)} extent tiles")
+
+    start = time.perf_counter()
+    tile_index = rw_areas._get_tile_index(extent_1x1)
+    print(f"Built grid index in {time.perf_counter() - start:.3f}s")
+
+    print("Tile lookup")
+    before = run_lookup("full scan", full_scan, geoms, extent_1x1, tile_index)
+    after = run_lookup(
+        "grid index", rw_areas._get_intersecting_tiles, geoms, extent_1x1, tile_index
+    )
+    after = [[tile[:3] for tile in tiles] for tiles in after]
+    assert before == after, "Tile lookups differ between full scan and grid index"
+
+    print("Tiling backends")
+    scalar = run_backend("geostore", False, geostores, extent_1x1, tile_index)
+    if rw_areas.VECTORIZED_TILING_AVAILABLE:
+        vectorized = run_backend("vectorized", True, geostores, extent_1x1, tile_index)
+        assert scalar == vectorized, "Rows differ between tiling backends"
+    else:
+        print("Skipping vectorized backend, it needs shapely 2")
+
+    print("Geometry repair")
+    run_repair(geoms)
+
+    rw_areas.GLOBALS.rw_areas_max_vertices = args.max_vertices
+    print(f"Simplification to {rw_areas.GLOBALS.rw_areas_max_vertices} vertices")
+    run_simplification(geoms, args.max_pixels)
+
+    print("Precision grid")
+    if rw_areas.VECTORIZED_TILING_AVAILABLE:
+        run_precision_grid(args.grid_size, args.max_pixels, geostores, scalar)
+    else:
+        print("Skipping precision grid, it needs shapely 2")
+
+
+if __name__ == "__main__":
+    main()
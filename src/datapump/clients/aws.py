@@ -1,14 +1,19 @@
+import io
+from typing import Any, Dict, List, Optional
 from urllib.parse import urlparse
 
 import boto3
 from botocore.config import Config
+from botocore.exceptions import ClientError
 
 from ..globals import GLOBALS
 
 config = Config(retries=dict(max_attempts=0), read_timeout=300)
+# synchronous invocations wait for the function to finish, up to Lambda's 15 minutes
+lambda_config = Config(retries=dict(max_attempts=0), read_timeout=960)
 
 
-def client_constructor(service: str):
+def client_constructor(service: str, client_config: Config = config):
     """Using closure design for a client constructor This way we only need to
     create the client once in central location and it will be easier to
     mock."""
@@ -21,7 +26,7 @@ def client_constructor(service: str):
                 service,
                 region_name=GLOBALS.aws_region,
                 endpoint_url=GLOBALS.aws_endpoint_uri,
-                config=config,
+                config=client_config,
             )
         return service_client
 
@@ -30,7 +35,7 @@ def client_constructor(service: str):
 
 get_s3_client = client_constructor("s3")
 get_emr_client = client_constructor("emr")
-get_lambda_client = client_constructor("lambda")
+get_lambda_client = client_constructor("lambda", lambda_config)
 get_dynamo_client = client_constructor("dynamodb")
 get_secrets_manager_client = client_constructor("secretsmanager")
 
@@ -44,3 +49,101 @@ def get_s3_path_parts(path):
 
 def get_s3_path(bucket, key):
     return "s3://{}/{}".format(bucket, key)
+
+
+def is_missing_object_error(e: ClientError) -> bool:
+    """Whether an S3 error is for an object that doesn't exist. get_object raises
+    NoSuchKey, head_object a bare 404"""
+    return e.response["Error"]["Code"] in ("NoSuchKey", "404")
+
+
+class MultipartUploadWriter(io.RawIOBase):
+    """
+    Writable file object streaming to an S3 object with a multipart upload, so only
+    one part is held in memory. Objects smaller than a part are sent with a single
+    put_object. The upload is completed on close, or aborted if the writer is left
+    with an exception or abort is called.
+    """
+
+    # S3 requires parts of at least 5 MB, except for the last one
+    PART_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, bucket: str, key: str, part_size: int = PART_SIZE):
+        super().__init__()
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.aborted = False
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+
+        self._buffer += b
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+
+        return len(b)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        try:
+            if self.aborted:
+                pass
+            elif self._upload_id is None:
+                get_s3_client().put_object(
+                    Body=bytes(self._buffer), Bucket=self.bucket, Key=self.key
+                )
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                get_s3_client().complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts},
+                )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+    def abort(self) -> None:
+        """Discard the upload, nothing is written to S3"""
+        if self._upload_id is not None and not self.aborted:
+            get_s3_client().abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+        self.aborted = True
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.abort()
+        self.close()
+
+    def _upload_part(self, body: bytes) -> None:
+        if self._upload_id is None:
+            self._upload_id = get_s3_client().create_multipart_upload(
+                Bucket=self.bucket, Key=self.key
+            )["UploadId"]
+
+        part_number = len(self._parts) + 1
+        response = get_s3_client().upload_part(
+            Body=body,
+            Bucket=self.bucket,
+            Key=self.key,
+            PartNumber=part_number,
+            UploadId=self._upload_id,
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
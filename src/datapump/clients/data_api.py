@@ -8,6 +8,11 @@ from retry import retry
 
 from ..globals import GLOBALS, LOGGER
 from ..util.exceptions import DataApiResponseError
+from ..util.features import (
+    get_compacted_features_manifest,
+    get_compacted_features_src,
+    list_geostore_features,
+)
 from .rw_api import token
 
 
@@ -47,9 +52,15 @@ class DataApiClient:
     def get_1x1_asset(self, dataset: str, version: str) -> str:
         # geostore and gadm are special
         if dataset == "geostore":
-            return (
-                f"s3://{GLOBALS.s3_bucket_pipeline}/geotrellis/features/geostore/*.tsv"
-            )
+            # compacted features are only complete if no nightly file was added since
+            compacted = get_compacted_features_manifest()
+            if compacted is not None and set(list_geostore_features()) <= set(
+                compacted["sources"]
+            ):
+                return get_compacted_features_src(compacted)
+
+            # nightly files of both formats are read, TSV files may be gzipped
+            return f"s3://{GLOBALS.s3_bucket_pipeline}/geotrellis/features/geostore/*.{{tsv*,parquet}}"
         elif dataset == "gadm" and version == "v3.6":
             return "s3://gfw-files/2018_update/tsv/gadm36_adm2_1_1.csv"
         elif dataset == "gadm" and version == "v4.1":
@@ -2,16 +2,24 @@ import csv
 import io
 import json
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from retry import retry  # type: ignore[import]
 
 from ..globals import GLOBALS, LOGGER
-from ..util.exceptions import UnexpectedResponseError
+from ..util.exceptions import RetryableResponseError, UnexpectedResponseError
 from ..util.slack import slack_webhook
 from ..util.util import api_prefix, get_date_string
 from .aws import get_secrets_manager_client
 
 TOKEN = None
+STATUS_UPDATE_RETRIES = 3
+STATUS_UPDATE_RETRY_DELAY = 1  # seconds
+STATUS_UPDATE_RETRY_MAX_DELAY = 30  # seconds
+# geostores isolated before any chunk is updated, before failed chunks are no
+# longer split
+STATUS_UPDATE_MAX_FAILURES = 3
 
 
 def token() -> str:
@@ -31,6 +39,14 @@ def _get_token() -> str:
 
 
 def update_area_statuses(geostore_ids, status):
+    """
+    Update status of user areas by geostore ID. Geostores are sent in chunks with a
+    bounded number of concurrent requests. Chunks rejected by the API are split in
+    half until the failing geostore IDs are isolated, unless no chunk went through
+    yet. Throttled, server side and connection errors are retried, and fail the
+    whole chunk once retries run out. Returns the geostore IDs which could not be
+    updated.
+    """
     url = f"https://{api_prefix()}-api.globalforestwatch.org/v2/area/update"
 
     headers = {
@@ -38,25 +54,91 @@ def update_area_statuses(geostore_ids, status):
         "Authorization": f"Bearer {token()}",
     }
 
-    errors = False
-    for gid in geostore_ids:
-        r = requests.post(
-            url,
-            json=_update_aoi_statuses_payload([gid], status),
-            headers=headers,
-        )
-
-        if r.status_code != 200:
-            LOGGER.error(
-                f"Status update failed for geostore {gid} with {r.status_code}"
-            )
-
+    # callers pass sets as well as lists
+    geostore_ids = list(geostore_ids)
+    chunk_size = GLOBALS.rw_area_status_chunk_size
+    chunks = [
+        geostore_ids[i : i + chunk_size]
+        for i in range(0, len(geostore_ids), chunk_size)
+    ]
+
+    # IDs of the chunks updated and of the geostores isolated as failing so far,
+    # shared by all requests
+    progress = {"updated": [], "failed": []}
+    failed_ids = []
+    with ThreadPoolExecutor(max_workers=GLOBALS.rw_api_max_workers) as executor:
+        for chunk_failed_ids in executor.map(
+            lambda chunk: _update_area_statuses_chunk(
+                url, chunk, status, headers, progress
+            ),
+            chunks,
+        ):
+            failed_ids += chunk_failed_ids
+
+    errors = bool(failed_ids)
     if errors:
+        LOGGER.error(
+            f"Status update to {status} failed for {len(failed_ids)} of "
+            f"{len(geostore_ids)} geostores: {failed_ids}"
+        )
         slack_webhook(
             "WARNING", "Some user areas could not have statuses updated. See logs."
         )
 
-    return 200
+    return failed_ids
+
+
+def _update_area_statuses_chunk(url, geostore_ids, status, headers, progress):
+    try:
+        _post_area_statuses(url, geostore_ids, status, headers)
+        progress["updated"].append(geostore_ids[0])
+        return []
+    except RetryableResponseError as e:
+        LOGGER.warning(
+            f"Status update failed for {len(geostore_ids)} geostores after retries: {e}"
+        )
+        return geostore_ids
+    except UnexpectedResponseError as e:
+        LOGGER.warning(f"Status update failed for {len(geostore_ids)} geostores: {e}")
+
+    # nothing went through yet, the API likely rejects every request
+    if len(geostore_ids) == 1 or (
+        not progress["updated"]
+        and len(progress["failed"]) >= STATUS_UPDATE_MAX_FAILURES
+    ):
+        progress["failed"].extend(geostore_ids)
+        return geostore_ids
+
+    middle = len(geostore_ids) // 2
+    return _update_area_statuses_chunk(
+        url, geostore_ids[:middle], status, headers, progress
+    ) + _update_area_statuses_chunk(
+        url, geostore_ids[middle:], status, headers, progress
+    )
+
+
+@retry(
+    RetryableResponseError,
+    delay=STATUS_UPDATE_RETRY_DELAY,
+    backoff=2,
+    jitter=(0, STATUS_UPDATE_RETRY_DELAY),
+    max_delay=STATUS_UPDATE_RETRY_MAX_DELAY,
+    tries=STATUS_UPDATE_RETRIES,
+)
+def _post_area_statuses(url, geostore_ids, status, headers):
+    try:
+        r = requests.post(
+            url,
+            json=_update_aoi_statuses_payload(geostore_ids, status),
+            headers=headers,
+        )
+    except requests.RequestException as e:
+        raise RetryableResponseError(f"area/update request failed: {e}")
+
+    if r.status_code == 429 or r.status_code >= 500:
+        raise RetryableResponseError(f"area/update returned response {r.status_code}")
+    elif r.status_code != 200:
+        raise UnexpectedResponseError(f"area/update returned response {r.status_code}")
 
 
 def _update_aoi_statuses_payload(geostore_ids, status):
@@ -0,0 +1,12 @@
+from typing import Literal, Optional
+
+from datapump.util.models import StrictBaseModel
+
+
+class CompactFeaturesParameters(StrictBaseModel):
+    version: Optional[str] = None
+
+
+class CompactFeaturesCommand(StrictBaseModel):
+    command: Literal["compact_features"]
+    parameters: CompactFeaturesParameters = CompactFeaturesParameters()
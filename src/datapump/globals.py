@@ -1,9 +1,9 @@
 import json
 import logging
 import os
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseSettings, Field, PositiveInt
+from pydantic import BaseSettings, Field, PositiveFloat, PositiveInt
 
 LOGGER = logging.getLogger("datapump")
 LOGGER.setLevel(logging.DEBUG)
@@ -46,6 +46,15 @@ class Globals(EnvSettings):
     )
     worker_count_min: PositiveInt = Field(10)
     worker_count_per_gb_features: PositiveInt = Field(50)
+    # workers per square degree of clipped user area and per million vertices,
+    # from the features manifest, and the most workers a rw_areas sync gets
+    rw_areas_workers_per_sq_degree: PositiveFloat = Field(
+        0.5, env="RW_AREAS_WORKERS_PER_SQ_DEGREE"
+    )
+    rw_areas_workers_per_million_vertices: PositiveFloat = Field(
+        2.0, env="RW_AREAS_WORKERS_PER_MILLION_VERTICES"
+    )
+    rw_areas_worker_count_max: PositiveInt = Field(100, env="RW_AREAS_WORKER_COUNT_MAX")
 
     # if LOCALSTACK_HOSTNAME is set, it means we're running in a mock environment
     # and should use that as the endpoint URI
@@ -58,6 +67,76 @@ class Globals(EnvSettings):
     max_versions: int = Field(4, env="MAX_VERSIONS")
     datapump_table_name: Optional[str] = Field(env="DATAPUMP_TABLE_NAME")
 
+    # page size and number of concurrent requests used when reading from RW API
+    rw_areas_page_size: PositiveInt = Field(25, env="RW_AREAS_PAGE_SIZE")
+    rw_api_max_workers: PositiveInt = Field(8, env="RW_API_MAX_WORKERS")
+    # number of geostores per area status update request
+    rw_area_status_chunk_size: PositiveInt = Field(100, env="RW_AREA_STATUS_CHUNK_SIZE")
+    # number of user areas fetched and tiled at a time, bounds memory use. In the
+    # dispatcher, tiling stops the time margin in seconds before the Lambda times
+    # out, leaving time to write the features of the areas tiled so far. The rest
+    # are tiled in the next run. Run elsewhere, tiling stops after the time budget
+    rw_areas_chunk_size: PositiveInt = Field(250, env="RW_AREAS_CHUNK_SIZE")
+    rw_areas_time_margin: PositiveInt = Field(90, env="RW_AREAS_TIME_MARGIN")
+    rw_areas_time_budget: PositiveInt = Field(210, env="RW_AREAS_TIME_BUDGET")
+    # format of the user area features file, parquet needs pyarrow. The Geotrellis
+    # jar doesn't read GeoParquet yet, so parquet is only written once
+    # RW_AREAS_PARQUET_ENABLED is set, after which compacting features migrates
+    # older TSV files into parquet parts
+    rw_areas_features_format: Literal["tsv", "parquet"] = Field(
+        "tsv", env="RW_AREAS_FEATURES_FORMAT"
+    )
+    rw_areas_parquet_enabled: bool = Field(False, env="RW_AREAS_PARQUET_ENABLED")
+    # gzip the user area features file, Spark reads it transparently
+    rw_areas_compress_features: bool = Field(False, env="RW_AREAS_COMPRESS_FEATURES")
+    # tile this many chunks of user areas at a time, each in its own invocation of
+    # the tiling function. Without a function, chunks are tiled in process one at a
+    # time
+    rw_areas_fanout_workers: Optional[PositiveInt] = Field(
+        None, env="RW_AREAS_FANOUT_WORKERS"
+    )
+    rw_areas_tiling_function: Optional[str] = Field(
+        None, env="RW_AREAS_TILING_FUNCTION"
+    )
+    # number of processes used to tile user areas, defaults to all available cores
+    rw_areas_tiling_workers: Optional[PositiveInt] = Field(
+        None, env="RW_AREAS_TILING_WORKERS"
+    )
+    # simplify user areas with more vertices than this before tiling, off until its
+    # effect on results is validated. The tolerance in degrees stays below half a
+    # 30 m pixel (0.00025 degrees)
+    rw_areas_max_vertices: Optional[PositiveInt] = Field(
+        None, env="RW_AREAS_MAX_VERTICES"
+    )
+    rw_areas_max_simplify_tolerance: PositiveFloat = Field(
+        0.000125, env="RW_AREAS_MAX_SIMPLIFY_TOLERANCE"
+    )
+    # repair user area geometries with a double buffer, or with make_valid and only
+    # buffer geometries with slivers
+    rw_areas_geometry_repair: Literal["buffer", "make_valid"] = Field(
+        "buffer", env="RW_AREAS_GEOMETRY_REPAIR"
+    )
+    # tile user areas with shapely 2 array operations instead of per geometry calls
+    rw_areas_vectorized_tiling: bool = Field(False, env="RW_AREAS_VECTORIZED_TILING")
+    # size in bytes of the geostores and tiles cached in /tmp across warm
+    # invocations, the least recently used are evicted beyond it
+    rw_areas_local_cache_size: PositiveInt = Field(
+        100 * 1024 * 1024, env="RW_AREAS_LOCAL_CACHE_SIZE"
+    )
+    # days cached geostores and tiles are kept on S3, deleted by the daily compaction
+    rw_areas_cache_expiration_days: PositiveInt = Field(
+        90, env="RW_AREAS_CACHE_EXPIRATION_DAYS"
+    )
+    # size in bytes of the parts nightly user area features are compacted into
+    rw_areas_compacted_part_size: PositiveInt = Field(
+        1_000_000_000, env="RW_AREAS_COMPACTED_PART_SIZE"
+    )
+    # nightly user area features files compacted per run, oldest first, so a run
+    # fits in the dispatcher's timeout. The rest are compacted by the next runs
+    rw_areas_compacted_max_sources: PositiveInt = Field(
+        30, env="RW_AREAS_COMPACTED_MAX_SOURCES"
+    )
+
     gcs_key_secret_arn: Optional[str] = Field(None, env="GCS_KEY_SECRET_ARN")
 
     google_application_credentials = Field(
@@ -65,4 +144,6 @@ class Globals(EnvSettings):
     )
 
 
-GLOBALS = Globals()
+# fields are read from the environment, which mypy doesn't know without the
+# pydantic plugin
+GLOBALS = Globals()  # type: ignore[call-arg]
@@ -1,5 +1,6 @@
 import csv
 import io
+import json
 import math
 import urllib
 from datetime import date, datetime, timedelta
@@ -10,7 +11,12 @@ from pprint import pformat
 from packaging.version import Version
 from typing import Any, Dict, List, Optional, Tuple
 
-from ..clients.aws import get_emr_client, get_s3_client, get_s3_path_parts
+from ..clients.aws import (
+    get_emr_client,
+    get_s3_client,
+    get_s3_path_parts,
+    is_missing_object_error,
+)
 from ..clients.data_api import DataApiClient
 from ..commands.analysis import Analysis, AnalysisInputTable
 from ..commands.sync import SyncType
@@ -24,12 +30,17 @@ from ..jobs.jobs import (
     Partition,
     Partitions,
 )
+from ..util.features import get_compacted_features_size, get_features_manifest_path
 from botocore.exceptions import ClientError
 import time
 
 WORKER_INSTANCE_TYPES = ["r5.2xlarge", "r4.2xlarge"]  # "r6g.2xlarge"
 MASTER_INSTANCE_TYPE = "r5.2xlarge"
 GEOTRELLIS_RETRIES = 3
+# parquet features store binary WKB, half the size of the hex WKB in TSV features
+PARQUET_FEATURES_SIZE_FACTOR = 2
+# workers for rw_areas syncs without a features manifest
+RW_AREAS_WORKER_COUNT_DEFAULT = 30
 
 
 class GeotrellisAnalysis(str, Enum):
@@ -683,14 +694,17 @@ class GeotrellisJob(Job):
         :return: number of workers appropriate for job size
         """
         if self.sync_type == SyncType.rw_areas:
-            return 30
+            return self._calculate_rw_areas_worker_count(limiting_src)
         elif self.table.analysis == Analysis.integrated_alerts:
             return 60
         elif self.change_only and self.table.analysis == Analysis.glad:
             return 10
 
+        # compacted user areas have their size in their manifest
+        compacted_size = get_compacted_features_size(limiting_src)
+
         # if using a wildcard for a folder, just use hardcoded value
-        if "*" in limiting_src:
+        if "*" in limiting_src and compacted_size is None:
             if GLOBALS.env == "production":
                 if self.table.analysis == Analysis.tcl or self.table.analysis == Analysis.viirs:
                     return 200
@@ -699,7 +713,11 @@ class GeotrellisJob(Job):
             else:
                 return 50
 
-        byte_size = self._get_byte_size(limiting_src)
+        byte_size = (
+            compacted_size
+            if compacted_size is not None
+            else self._get_byte_size(limiting_src)
+        )
 
         analysis_weight = 1.0
         if (
@@ -722,10 +740,92 @@ class GeotrellisJob(Job):
         )
         return max(worker_count, GLOBALS.worker_count_min)
 
+    def _calculate_rw_areas_worker_count(self, features_src: str) -> int:
+        """Calculate the number of workers for user areas from the totals of
+        their features manifest, weighting clipped area in square degrees and
+        vertices, which drive raster reads and polygon clipping.
+
+        :return: number of workers appropriate for job size
+        """
+        totals = self._get_features_manifest_totals(features_src)
+        if totals is None:
+            return RW_AREAS_WORKER_COUNT_DEFAULT
+
+        worker_count = math.ceil(
+            (
+                totals["area"] * GLOBALS.rw_areas_workers_per_sq_degree
+                + (totals["vertices"] / 1000000)
+                * GLOBALS.rw_areas_workers_per_million_vertices
+            )
+            * (1 + (0.25 * self.retries))
+        )
+        return min(
+            max(worker_count, GLOBALS.worker_count_min),
+            GLOBALS.rw_areas_worker_count_max,
+        )
+
+    def _calculate_partition_count(self, executor_count: int) -> int:
+        """Spark partitions, three per executor. For user areas, each row is
+        one geostore tile, so partitions beyond the number of rows stay empty.
+        """
+        partition_count = executor_count * 3
+        if self.sync_type == SyncType.rw_areas:
+            totals = self._get_features_manifest_totals(self.features_1x1)
+            if totals is not None:
+                partition_count = max(
+                    min(partition_count, totals["tiles"]), executor_count
+                )
+
+        return partition_count
+
+    def _get_extent_flag(self) -> Optional[str]:
+        """Flag of the extent grid tiles the analysis is limited to, if any"""
+        if self.table.analysis == Analysis.tcl:
+            return "tcl"
+        elif (
+            self.table.analysis == Analysis.glad
+            or self.table.analysis == Analysis.integrated_alerts
+        ):
+            return "glad"
+
+        return None
+
+    def _get_features_manifest_totals(
+        self, features_src: str
+    ) -> Optional[Dict[str, Any]]:
+        """Totals of the features manifest. For analyses limited to an extent, only
+        the totals of the rows flagged with it, the only ones they read.
+        """
+        bucket, key = get_s3_path_parts(get_features_manifest_path(features_src))
+        try:
+            resp = get_s3_client().get_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if is_missing_object_error(e):
+                LOGGER.warning(f"No features manifest found for {features_src}")
+                return None
+            raise
+
+        totals = json.loads(resp["Body"].read())["totals"]
+        extent_flag = self._get_extent_flag()
+        # manifests written before extent totals have the full totals only
+        if extent_flag and f"{extent_flag}_tiles" in totals:
+            return {
+                field: totals[f"{extent_flag}_{field}"]
+                for field in ("tiles", "vertices", "area", "bytes")
+            }
+
+        return totals
+
     @staticmethod
     def _get_byte_size(src: str):
+        """
+        Size of the features as TSV, which worker counts are calibrated for
+        """
         bucket, key = get_s3_path_parts(src)
         resp = get_s3_client().head_object(Bucket=bucket, Key=key)
+
+        if key.endswith(".parquet"):
+            return resp["ContentLength"] * PARQUET_FEATURES_SIZE_FACTOR
         return resp["ContentLength"]
 
     def _get_step(self) -> Dict[str, Any]:
@@ -757,13 +857,9 @@ class GeotrellisJob(Job):
         ]
 
         # These limit the extent to look at for certain types of analyses
-        if self.table.analysis == Analysis.tcl:
-            step_args.append("--tcl")
-        elif (
-            self.table.analysis == Analysis.glad
-            or self.table.analysis == Analysis.integrated_alerts
-        ):
-            step_args.append("--glad")
+        extent_flag = self._get_extent_flag()
+        if extent_flag:
+            step_args.append(f"--{extent_flag}")
 
         if self.change_only:
             step_args.append("--change_only")
@@ -945,7 +1041,7 @@ class GeotrellisJob(Job):
 
     def _configurations(self, worker_count: int) -> List[Dict[str, Any]]:
         executor_count = worker_count * 7
-        partition_count = executor_count * 3
+        partition_count = self._calculate_partition_count(executor_count)
 
         spark_defaults = {
             "spark.yarn.appMasterEnv.GDAL_HTTP_MAX_RETRY": "3",
@@ -1,8 +1,8 @@
 import csv
-import io
 import os
-import shutil
+import tempfile
 import zipfile
+from contextlib import nullcontext
 
 import requests
 import shapefile
@@ -27,37 +27,16 @@ SHP_NAMES = {
 }
 
 TEMP_DIR = "/tmp"
+# downloaded zips are kept in memory up to this size, larger ones spill to TEMP_DIR
+ZIP_MAX_MEMORY = 256 * 1024 * 1024  # bytes
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # bytes
 
 
 def process_active_fire_alerts(alert_type):
     LOGGER.info(f"Retrieving fire alerts for {alert_type}")
-    response = requests.get(ACTIVE_FIRE_ALERTS_7D_SHAPEFILE_URLS[alert_type])
-
-    if response.status_code != 200:
-        raise Exception(
-            f"Unable to get active {alert_type} fire alerts, FIRMS returned status code {response.status_code}"
-        )
-
-    LOGGER.info("Successfully downloaded alerts from NASA")
-
-    zip = zipfile.ZipFile(io.BytesIO(response.content))
-    shp_dir = f"{TEMP_DIR}/fire_alerts_{alert_type}"
-    zip.extractall(shp_dir)
-
-    if not os.path.isfile(f"{shp_dir}/{SHP_NAMES[alert_type]}"):
-        raise Exception(
-            f"{alert_type} fire alerts zip downloaded, but contains no .shp file!"
-        )
-
-    sf = shapefile.Reader(f"{shp_dir}/{SHP_NAMES[alert_type]}")
-
-    rows = []
-    for shape_record in sf.iterShapeRecords():
-        row = shape_record.record.as_dict()
-        row["LATITUDE"] = shape_record.shape.points[0][1]
-        row["LONGITUDE"] = shape_record.shape.points[0][0]
-        row["ACQ_DATE"] = row["ACQ_DATE"].strftime("%Y-%m-%d")
-        rows.append(row)
+    with _download_zip(alert_type) as zip_file:
+        LOGGER.info("Successfully downloaded alerts from NASA")
+        rows = _read_shapefile_rows(zip_file, alert_type)
 
     sorted_rows = sorted(rows, key=lambda row: f"{row['ACQ_DATE']}_{row['ACQ_TIME']}")
 
@@ -117,12 +96,62 @@ def process_active_fire_alerts(alert_type):
 
     LOGGER.info(f"Successfully uploaded to s3://{DATA_LAKE_BUCKET}/{pipeline_key}")
 
-    # remove raw shapefile, since it can be big and hit max lambda storage size of 512 MB
-    shutil.rmtree(shp_dir)
-
     return (f"s3a://{DATA_LAKE_BUCKET}/{pipeline_key}", last_row["ACQ_DATE"])
 
 
+def _download_zip(alert_type):
+    """
+    Stream the shapefile zip into a buffer kept in memory up to ZIP_MAX_MEMORY
+    """
+    url = ACTIVE_FIRE_ALERTS_7D_SHAPEFILE_URLS[alert_type]
+    zip_file = tempfile.SpooledTemporaryFile(max_size=ZIP_MAX_MEMORY, dir=TEMP_DIR)
+    try:
+        with requests.get(url, stream=True) as response:
+            if response.status_code != 200:
+                raise Exception(
+                    f"Unable to get active {alert_type} fire alerts, FIRMS returned status code {response.status_code}"
+                )
+
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                zip_file.write(chunk)
+    except Exception:
+        zip_file.close()
+        raise
+
+    zip_file.seek(0)
+    return zip_file
+
+
+def _read_shapefile_rows(zip_file, alert_type):
+    """
+    Read alerts from the shapefile members of the zip, without extracting them
+    """
+    with zipfile.ZipFile(zip_file) as zip:
+        shp_name = SHP_NAMES[alert_type]
+        if shp_name not in zip.namelist():
+            raise Exception(
+                f"{alert_type} fire alerts zip downloaded, but contains no .shp file!"
+            )
+
+        # the index is optional, records are read in order
+        name = os.path.splitext(shp_name)[0]
+        shx_name = f"{name}.shx"
+        with zip.open(shp_name) as shp, zip.open(f"{name}.dbf") as dbf, (
+            zip.open(shx_name) if shx_name in zip.namelist() else nullcontext()
+        ) as shx:
+            sf = shapefile.Reader(shp=shp, shx=shx, dbf=dbf)
+
+            rows = []
+            for shape_record in sf.iterShapeRecords():
+                row = shape_record.record.as_dict()
+                row["LATITUDE"] = shape_record.shape.points[0][1]
+                row["LONGITUDE"] = shape_record.shape.points[0][0]
+                row["ACQ_DATE"] = row["ACQ_DATE"].strftime("%Y-%m-%d")
+                rows.append(row)
+
+    return rows
+
+
 def get_tmp_result_path(alert_type):
     return f"{TEMP_DIR}/fire_alerts_{alert_type.lower()}.tsv"
 
@@ -1,82 +1,688 @@
+import gzip
+import hashlib
 import io
+import itertools
 import json
+import math
 import os
+import resource
+import shutil
+import threading
+import time
 import traceback
-from contextlib import contextmanager
-from datetime import datetime, timedelta
-from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
-
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from multiprocessing import Pipe, Process
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
 import requests
+import shapely
+from botocore.exceptions import BotoCoreError, ClientError
+from packaging.version import Version
 from requests import Response
-from shapely.geometry import MultiPolygon, Polygon, shape
-from shapely.wkb import dumps
-
-from ..clients.aws import get_s3_client, get_s3_path, get_s3_path_parts
+from retry import retry  # type: ignore[import]
+from shapely.geometry import MultiPolygon, Polygon, box, shape
+from shapely.geometry.polygon import orient
+from shapely.prepared import prep
+from shapely.validation import make_valid
+from shapely.wkb import dumps, loads
+
+from ..clients.aws import (
+    MultipartUploadWriter,
+    get_lambda_client,
+    get_s3_client,
+    get_s3_path,
+    get_s3_path_parts,
+    is_missing_object_error,
+)
 from ..clients.rw_api import token, update_area_statuses
 from ..globals import GLOBALS, LOGGER
-from ..util.exceptions import EmptyResponseException, UnexpectedResponseError
+from ..util.exceptions import (
+    EmptyResponseException,
+    RetryableResponseError,
+    UnexpectedResponseError,
+)
+from ..util.features import (
+    GEOSTORE_FEATURES_PREFIX,
+    TSV_HEADER,
+    TileSortedWriter,
+    get_features_format,
+    get_features_manifest_path,
+    get_features_path,
+    get_features_writer,
+    get_tile_id,
+    write_features_sidecars,
+)
 from ..util.slack import slack_webhook
 from ..util.util import api_prefix
 
 DIRNAME = os.path.dirname(__file__)
 GEOSTORE_PAGE_SIZE = 25
+GEOSTORE_MAX_PAGE_SIZE = 100
+GEOSTORE_TARGET_LATENCY = 10  # seconds
+GEOSTORE_MAX_PAYLOAD_SIZE = 5 * 1024 * 1024  # bytes
+GEOSTORE_RETRIES = 3
+GEOSTORE_RETRY_DELAY = 1  # seconds
+GEOSTORE_RETRY_MAX_DELAY = 30  # seconds
+# geostores failing before any batch succeeds, before giving up on the RW API
+GEOSTORE_MAX_FAILURES = 3
+# geostores failing to tile in a row, before giving up on tiling in this run
+TILING_MAX_FAILURES = 3
+VECTORIZED_TILING_AVAILABLE = Version(shapely.__version__) >= Version("2.0.0")
+# slivers narrower than this, in degrees, are removed before tiling
+SLIVER_WIDTH = 0.0001
+# settings which change how geostores are tiled, sent to tiling workers so they tile
+# the same way as the dispatcher whatever their own environment
+TILING_SETTINGS = (
+    "rw_areas_geometry_repair",
+    "rw_areas_max_vertices",
+    "rw_areas_max_simplify_tolerance",
+    "rw_areas_vectorized_tiling",
+)
+# precision grid in degrees geometries are snapped to when repaired with make_valid
+REPAIR_GRID_SIZE = 1e-9
+EXTENT_1X1_KEY = "geotrellis/features/extent_1x1.geojson"
+EXTENT_1X1_CACHE = "/tmp/extent_1x1.npz"
+GEOSTORE_CACHE_PREFIX = "geotrellis/features/geostore_cache"
+TILE_CACHE_PREFIX = "geotrellis/features/geostore_tiles"
+# bump when tiling output changes, so cached tile fragments aren't reused
+TILE_CACHE_VERSION = 3
+CACHE_DIR = "/tmp/rw_areas_cache"
+CACHE_WORKERS = 10  # matches boto3's default connection pool size
+CHECKPOINT_PREFIX = "geotrellis/features/geostore_checkpoint"
+CHECKPOINT_KEY = f"{CHECKPOINT_PREFIX}/checkpoint.json"
+# extent grid flags of the rows, analyses limited to one only read rows with it
+EXTENT_FLAGS = ("tcl", "glad")
+
+
+def create_1x1_tsv(version: str, deadline: Optional[float] = None) -> Optional[str]:
+    features_format: str = get_features_format()
+    geostore_path = get_features_path(
+        f"{GEOSTORE_FEATURES_PREFIX}/{version}", features_format
+    )
 
+    # rows are streamed to S3 as they are written, so memory use doesn't depend on
+    # the number of user areas
+    costs: Dict[str, Dict[str, float]] = {}
+    with MultipartUploadWriter(GLOBALS.s3_bucket_pipeline, geostore_path) as upload:
+        with get_features_writer(
+            upload, features_format
+        ) as features, TileSortedWriter(features) as tsv:
+            geom_count = write_1x1_tsv(tsv, costs, deadline)
+
+        if geom_count:
+            LOGGER.info("Geostores processed, uploading and analyzing")
+        else:
+            upload.abort()
 
-def create_1x1_tsv(version: str) -> Optional[str]:
-    tsv = get_virtual_1x1_tsv()
+    if geom_count:
+        # chunks are merged into the features file, only the rest is tiled next time
+        _drop_merged_chunks()
 
-    if tsv:
-        LOGGER.info("Geostores processed, uploading and analyzing")
-        geostore_path = f"geotrellis/features/geostore/{version}.tsv"
+        geostore_src = get_s3_path(GLOBALS.s3_bucket_pipeline, geostore_path)
+        write_features_sidecars(geostore_src, tsv)
+        _, manifest_key = get_s3_path_parts(get_features_manifest_path(geostore_src))
         get_s3_client().put_object(
-            Body=tsv,
+            Body=json.dumps(
+                {"geostores": costs, "totals": _get_cost_totals(costs)}
+            ).encode("utf-8"),
             Bucket=GLOBALS.s3_bucket_pipeline,
-            Key=geostore_path,
+            Key=manifest_key,
         )
-        return get_s3_path(GLOBALS.s3_bucket_pipeline, geostore_path)
+        return geostore_src
     else:
         LOGGER.info("No geostores to process")
         return None
 
 
-def get_virtual_1x1_tsv() -> Optional[bytes]:
+def write_1x1_tsv(
+    tsv: io.IOBase,
+    costs: Optional[Dict[str, Dict[str, float]]] = None,
+    deadline: Optional[float] = None,
+) -> int:
     """
-    Main Lambda function
+    Main Lambda function. Tiles pending user areas one chunk of geostores at a
+    time, saving each chunk's rows to S3 and recording progress in a checkpoint.
+    Tiling stops at the deadline, a time.monotonic() value, or after
+    RW_AREAS_TIME_BUDGET seconds without one. The chunks tiled so far are then
+    merged into the features TSV, and costs is filled with the tile count,
+    vertices, clipped area and bytes of each geostore. Geostores which can't be
+    tiled are set to error and skipped. If tiling fails otherwise, the chunks tiled
+    so far are still merged. The next run resumes from the checkpoint, with areas
+    which became pending since added to it. Returns the number of rows written, 0
+    if there is nothing to process or processing failed.
     """
 
-    LOGGER.info("Check for pending areas")
+    if deadline is None:
+        deadline = time.monotonic() + GLOBALS.rw_areas_time_budget
 
     try:
-        areas: List[Any] = get_pending_areas()
-        geostore_ids: List[str] = get_geostore_ids(areas)
-        if not geostore_ids:
-            raise EmptyResponseException
-
-        geostore: Dict[str, Any] = get_geostore(geostore_ids)
-        geostore = filter_geostores(geostore)
+        LOGGER.info("Check for pending areas")
+        geostore_ids: List[str] = get_geostore_ids(get_pending_areas())
+        checkpoint: Optional[Dict[str, Any]] = _read_checkpoint()
+        if checkpoint is None:
+            if not geostore_ids:
+                raise EmptyResponseException
 
-        if not geostore:
+            checkpoint = _start_checkpoint(geostore_ids)
+        else:
+            LOGGER.info(
+                f"Resuming tiling of {len(checkpoint['geostore_ids'])} geostores "
+                f"started at {checkpoint['started']}, {checkpoint['next']} done"
+            )
+            _add_to_checkpoint(checkpoint, geostore_ids)
+
+        tiled: bool = False
+        try:
+            tiled = _tile_checkpointed_chunks(checkpoint, deadline)
+        except Exception:
+            # the checkpoint keeps the chunks tiled so far, so they're merged still
+            LOGGER.error(traceback.format_exc())
+            slack_webhook(
+                "ERROR",
+                f"Error tiling new user areas, analyzing the {checkpoint['next']} "
+                f"of {len(checkpoint['geostore_ids'])} tiled so far. "
+                "See logs for more info.",
+            )
+        else:
+            if not tiled:
+                slack_webhook(
+                    "INFO",
+                    f"Tiled {checkpoint['next']} of "
+                    f"{len(checkpoint['geostore_ids'])} new user areas, analyzing "
+                    "those and continuing in the next run.",
+                )
+
+        LOGGER.info("Start writing to TSV file")
+        geom_count = _merge_checkpointed_chunks(checkpoint, tsv, costs)
+        _log_peak_rss()
+
+        if geom_count == 0 and tiled:
+            # nothing to merge, so there is nothing to resume either
+            _delete_checkpoint()
             raise EmptyResponseException
 
-        with geostore_to_wkb(geostore) as (wkb, geom_count):
-            if geom_count == 0:
-                raise EmptyResponseException
-
-            return str.encode(wkb.getvalue())
+        return geom_count
     except EmptyResponseException:
         slack_webhook("INFO", "No new user areas found. Doing nothing.")
-        return None
+        return 0
     except Exception:
         LOGGER.error(traceback.format_exc())
         slack_webhook(
             "ERROR", "Error processing new user areas. See logs for more info."
         )
+        return 0
+
+
+def _start_checkpoint(geostore_ids: List[str]) -> Dict[str, Any]:
+    checkpoint: Dict[str, Any] = {
+        "started": datetime.now().strftime("%Y%m%d%H%M%S"),
+        "geostore_ids": geostore_ids,
+        "next": 0,
+        "chunks": [],
+    }
+    _write_checkpoint(checkpoint)
+    return checkpoint
+
+
+def _add_to_checkpoint(checkpoint: Dict[str, Any], geostore_ids: List[str]) -> None:
+    """
+    Add geostores which aren't in the checkpoint yet to the end of it
+    """
+    checkpointed: Set[str] = set(checkpoint["geostore_ids"])
+    new_ids: List[str] = [i for i in geostore_ids if i not in checkpointed]
+    if new_ids:
+        LOGGER.info(f"Adding {len(new_ids)} new geostores to the checkpoint")
+        checkpoint["geostore_ids"] += new_ids
+        _write_checkpoint(checkpoint)
+
+
+def _tile_checkpointed_chunks(checkpoint: Dict[str, Any], deadline: float) -> bool:
+    """
+    Tile the remaining chunks of a checkpoint in waves, recording chunks once their
+    rows are saved. If RW_AREAS_FANOUT_WORKERS and RW_AREAS_TILING_FUNCTION are
+    set, a wave is that many chunks, each tiled by an invocation of the tiling
+    function. Otherwise it's a single chunk tiled in process. A wave is only
+    started if it can finish before the deadline, going by the longest wave so
+    far, or before the first wave by the longest chunk of earlier runs.
+
+    A chunk which fails is tiled again in halves, down to single geostores, which
+    are set to error and skipped. They are only set to error once a later chunk
+    succeeds or all are tiled, and after TILING_MAX_FAILURES of them in a row
+    tiling gives up, raising an exception, as then it's tiling itself failing.
+    Returns False if the time budget ran out before all were tiled.
+    """
+    geostore_ids: List[str] = checkpoint["geostore_ids"]
+    if checkpoint["next"] >= len(geostore_ids):
+        return True
+
+    # tiling forks processes, which isn't safe from several threads, so chunks are
+    # only tiled concurrently in separate invocations
+    fanout_workers: Optional[int] = (
+        GLOBALS.rw_areas_fanout_workers if GLOBALS.rw_areas_tiling_function else None
+    )
+    tile: Callable[[Dict[str, Any]], Dict[str, Any]] = _invoke_tiling_worker
+    if not fanout_workers:
+        extent_1x1, tile_index, tiling_version = _get_tiling()
+        tile = partial(
+            _tile_chunk,
+            extent_1x1=extent_1x1,
+            tile_index=tile_index,
+            tiling_version=tiling_version,
+        )
+    settings: Dict[str, Any] = {
+        name: getattr(GLOBALS, name) for name in TILING_SETTINGS
+    }
+    chunk_size: int = GLOBALS.rw_areas_chunk_size
+    # chunks checkpointed before their duration was recorded have none
+    wave_duration: float = max(
+        (chunk.get("duration", 0.0) for chunk in checkpoint["chunks"]), default=0.0
+    )
+
+    try_tile: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]] = partial(
+        _try_tile_chunk, tile
+    )
+    # positions of the geostores which failed since the last chunk tiled
+    failed: List[int] = []
+
+    try:
+        while checkpoint["next"] < len(geostore_ids):
+            if _out_of_time(deadline, wave_duration):
+                LOGGER.info(
+                    f"Time budget used up after {checkpoint['next']} of "
+                    f"{len(geostore_ids)} geostores"
+                )
+                _save_tiling_progress(checkpoint, failed)
+                return False
+
+            shards: List[Dict[str, Any]] = [
+                {
+                    "started": checkpoint["started"],
+                    "start": start,
+                    "geostore_ids": geostore_ids[start : start + chunk_size],
+                    "settings": settings,
+                }
+                for start in range(
+                    checkpoint["next"],
+                    min(
+                        checkpoint["next"] + chunk_size * (fanout_workers or 1),
+                        len(geostore_ids),
+                    ),
+                    chunk_size,
+                )
+            ]
+            wave_start: float = time.monotonic()
+            if fanout_workers:
+                # threads only wait on the invocations
+                with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+                    chunks = list(executor.map(try_tile, shards))
+            else:
+                chunks = [try_tile(shards[0])]
+            wave_duration = max(wave_duration, time.monotonic() - wave_start)
+
+            for shard, chunk in zip(shards, chunks):
+                if chunk is None:
+                    if not _tile_failed_chunk(
+                        try_tile, shard, checkpoint, failed, deadline
+                    ):
+                        _save_tiling_progress(checkpoint, failed)
+                        return False
+                else:
+                    _record_chunk(checkpoint, shard, chunk, failed)
+            _write_checkpoint(checkpoint)
+
+        _set_failed_to_error(checkpoint, failed)
+        return True
+    except Exception:
+        _save_tiling_progress(checkpoint, failed)
+        raise
+
+
+def _save_tiling_progress(checkpoint: Dict[str, Any], failed: List[int]) -> None:
+    """
+    Save the checkpoint when tiling stops early. It ends at the first failed
+    geostore, as those aren't known to be the geostores' fault yet, so are tiled
+    again in the next run.
+    """
+    if failed:
+        checkpoint["next"] = failed[0]
+    _write_checkpoint(checkpoint)
+
+
+def _try_tile_chunk(
+    tile: Callable[[Dict[str, Any]], Dict[str, Any]], shard: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """Tile a chunk, returning None if it failed"""
+    try:
+        return tile(shard)
+    except Exception:
+        LOGGER.error(
+            f"Tiling geostores {shard['start']} to "
+            f"{shard['start'] + len(shard['geostore_ids'])} failed:\n"
+            f"{traceback.format_exc()}"
+        )
         return None
 
 
-def get_pending_areas() -> List[Any]:
+def _tile_failed_chunk(
+    try_tile: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+    shard: Dict[str, Any],
+    checkpoint: Dict[str, Any],
+    failed: List[int],
+    deadline: float,
+) -> bool:
+    """
+    Tile a chunk which failed again in halves, recording those which succeed, down
+    to single geostores, which are added to failed and skipped. Returns False if
+    the time budget ran out first.
+    """
+    chunk_ids: List[str] = shard["geostore_ids"]
+    if len(chunk_ids) == 1:
+        failed.append(shard["start"])
+        if len(failed) >= TILING_MAX_FAILURES:
+            raise Exception(f"Tiling failed for {len(failed)} geostores in a row")
+        checkpoint["next"] = shard["start"] + 1
+        return True
+
+    middle: int = len(chunk_ids) // 2
+    for offset, half_ids in ((0, chunk_ids[:middle]), (middle, chunk_ids[middle:])):
+        if _out_of_time(deadline):
+            return False
+
+        half: Dict[str, Any] = dict(
+            shard, start=shard["start"] + offset, geostore_ids=half_ids
+        )
+        chunk = try_tile(half)
+        if chunk is None:
+            if not _tile_failed_chunk(try_tile, half, checkpoint, failed, deadline):
+                return False
+        else:
+            _record_chunk(checkpoint, half, chunk, failed)
+
+    return True
+
+
+def _record_chunk(
+    checkpoint: Dict[str, Any],
+    shard: Dict[str, Any],
+    chunk: Dict[str, Any],
+    failed: List[int],
+) -> None:
     """
-    Request to GFW API to get list of user areas which were recently submitted and need to be added to nightly updates
+    Add a tiled chunk to the checkpoint. Tiling works then, so the geostores which
+    failed before it are set to error.
+    """
+    _set_failed_to_error(checkpoint, failed)
+    checkpoint["chunks"].append(chunk)
+    checkpoint["next"] = shard["start"] + len(shard["geostore_ids"])
+
+
+def _set_failed_to_error(checkpoint: Dict[str, Any], failed: List[int]) -> None:
+    if failed:
+        error_ids: List[str] = [checkpoint["geostore_ids"][i] for i in failed]
+        LOGGER.info(f"Setting geostore IDs which failed to tile to error: {error_ids}")
+        update_area_statuses(error_ids, "error")
+        failed.clear()
+
+
+def tile_chunk(shard: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Tiling worker. Tiles a chunk of geostores of a checkpoint and saves its rows to
+    S3, with the tiling settings of the shard. Returns the chunk to record in the
+    checkpoint, with the key of the rows, their count, the costs of each geostore
+    and how long tiling took.
+    """
+    for name, value in shard.get("settings", {}).items():
+        setattr(GLOBALS, name, value)
+
+    return _tile_chunk(shard, *_get_tiling())
+
+
+def _invoke_tiling_worker(shard: Dict[str, Any]) -> Dict[str, Any]:
+    response = get_lambda_client().invoke(
+        FunctionName=GLOBALS.rw_areas_tiling_function,
+        InvocationType="RequestResponse",
+        Payload=json.dumps(shard).encode("utf-8"),
+    )
+    payload = json.loads(response["Payload"].read())
+    if "FunctionError" in response:
+        raise UnexpectedResponseError(
+            f"Tiling worker failed for geostores {shard['start']} to "
+            f"{shard['start'] + len(shard['geostore_ids'])}: {payload}"
+        )
+
+    return payload
+
+
+def _get_tiling() -> (
+    Tuple[List[Tuple[Polygon, bool, bool]], Dict[Tuple[int, int], List[int]], str]
+):
+    """
+    Extent grid, its tile index and the tiling version
+    """
+    extent_1x1, extent_etag = _get_extent_1x1()
+    return extent_1x1, _get_tile_index(extent_1x1), _get_tiling_version(extent_etag)
+
+
+def _tile_chunk(
+    shard: Dict[str, Any],
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+    tiling_version: str,
+) -> Dict[str, Any]:
+    tiling_start: float = time.monotonic()
+    start: int = shard["start"]
+    chunk_ids: List[str] = shard["geostore_ids"]
+    LOGGER.info(f"Processing geostores {start} to {start + len(chunk_ids)}")
+
+    geostores = filter_geostores(get_geostore(chunk_ids))["data"]
+    rows = io.BytesIO()
+    chunk_costs: Dict[str, Dict[str, float]] = {}
+    row_count = _write_tiled_geostores(
+        _tile_geostores_with_cache(geostores, extent_1x1, tile_index, tiling_version),
+        lambda row: rows.write(row.encode("utf-8")),
+        chunk_costs,
+    )
+    del geostores
+
+    chunk_key = f"{CHECKPOINT_PREFIX}/{shard['started']}/{start:07}.tsv.gz"
+    get_s3_client().put_object(
+        Body=gzip.compress(rows.getvalue()),
+        Bucket=GLOBALS.s3_bucket_pipeline,
+        Key=chunk_key,
+    )
+
+    return {
+        "key": chunk_key,
+        "rows": row_count,
+        "costs": chunk_costs,
+        "duration": time.monotonic() - tiling_start,
+    }
+
+
+def _merge_checkpointed_chunks(
+    checkpoint: Dict[str, Any],
+    tsv: io.IOBase,
+    costs: Optional[Dict[str, Dict[str, float]]] = None,
+) -> int:
+    """
+    Stream the saved rows of all chunks into the features TSV, in chunk order,
+    and collect their geostore costs
+    """
+    tsv.write(TSV_HEADER.encode("utf-8"))
+    for chunk in checkpoint["chunks"]:
+        if costs is not None:
+            # checkpoints written before the manifest have no costs
+            costs.update(chunk.get("costs", {}))
+        if chunk["rows"]:
+            body = get_s3_client().get_object(
+                Bucket=GLOBALS.s3_bucket_pipeline, Key=chunk["key"]
+            )["Body"]
+            shutil.copyfileobj(gzip.GzipFile(fileobj=body), tsv)
+
+    return sum(chunk["rows"] for chunk in checkpoint["chunks"])
+
+
+def _out_of_time(deadline: float, expected_duration: float = 0.0) -> bool:
+    """Whether work expected to take that many seconds would end past the deadline"""
+    return time.monotonic() + expected_duration > deadline
+
+
+def _read_checkpoint() -> Optional[Dict[str, Any]]:
+    try:
+        response = get_s3_client().get_object(
+            Bucket=GLOBALS.s3_bucket_pipeline, Key=CHECKPOINT_KEY
+        )
+    except ClientError as e:
+        if is_missing_object_error(e):
+            return None
+        raise
+
+    return json.loads(response["Body"].read())
+
+
+def _write_checkpoint(checkpoint: Dict[str, Any]) -> None:
+    get_s3_client().put_object(
+        Body=json.dumps(checkpoint).encode("utf-8"),
+        Bucket=GLOBALS.s3_bucket_pipeline,
+        Key=CHECKPOINT_KEY,
+    )
+
+
+def _drop_merged_chunks() -> None:
+    """
+    Delete the rows saved for the chunks of the checkpoint, once they are merged
+    into a features file. The checkpoint itself is kept with the geostores left
+    to tile, if any.
+    """
+    checkpoint = _read_checkpoint()
+    if checkpoint is None or checkpoint["next"] >= len(checkpoint["geostore_ids"]):
+        _delete_checkpoint()
+        return
+
+    for chunk in checkpoint["chunks"]:
+        get_s3_client().delete_object(
+            Bucket=GLOBALS.s3_bucket_pipeline, Key=chunk["key"]
+        )
+    _start_checkpoint(checkpoint["geostore_ids"][checkpoint["next"] :])
+
+
+def _delete_checkpoint() -> None:
+    """
+    Delete the checkpoint and the rows saved for its chunks, once they are merged
+    into a features file
+    """
+    checkpoint = _read_checkpoint()
+    if checkpoint is None:
+        return
+
+    for chunk in checkpoint["chunks"]:
+        get_s3_client().delete_object(
+            Bucket=GLOBALS.s3_bucket_pipeline, Key=chunk["key"]
+        )
+    get_s3_client().delete_object(Bucket=GLOBALS.s3_bucket_pipeline, Key=CHECKPOINT_KEY)
+
+
+def _write_tiled_geostores(
+    tiled_geostores: Iterable[Tuple[List[str], Optional[str]]],
+    write: Callable[[str], Any],
+    costs: Optional[Dict[str, Dict[str, float]]] = None,
+) -> int:
+    """
+    Write rows of tiled geostores and set geostores which couldn't be tiled to
+    error. If costs is given, adds the cost of each row to its geostore. Returns
+    the number of rows written.
+    """
+    count: int = 0
+    error_ids: List[str] = []
+    for rows, error_id in tiled_geostores:
+        if error_id:
+            error_ids.append(error_id)
+            continue
+
+        for row in rows:
+            write(row)
+            count += 1
+            if costs is not None:
+                _add_row_cost(costs, row)
+
+    if error_ids:
+        LOGGER.info(f"Setting invalid geostore IDs to error: {error_ids}")
+        update_area_statuses(error_ids, "error")
+
+    return count
+
+
+def _add_row_cost(costs: Dict[str, Dict[str, float]], row: str) -> None:
+    """
+    Add the cost of a row to its geostore. Rows flagged in the extent grid also
+    add to the cost prefixed with the flag, e.g. tcl_area, which is all an analysis
+    limited to that extent reads.
+    """
+    geostore_id, geom, *flags = row.rstrip("\n").split("\t")[:4]
+    tile_geom = loads(bytes.fromhex(geom))
+    row_cost = {
+        "tiles": 1,
+        "vertices": _get_vertex_count(tile_geom),
+        "area": tile_geom.area,
+        "bytes": len(row.encode("utf-8")),
+    }
+    cost = costs.setdefault(
+        geostore_id, {"tiles": 0, "vertices": 0, "area": 0.0, "bytes": 0}
+    )
+    for field, value in row_cost.items():
+        cost[field] += value
+        for flag, flagged in zip(EXTENT_FLAGS, flags):
+            if flagged == "True":
+                cost[f"{flag}_{field}"] = cost.get(f"{flag}_{field}", 0) + value
+
+
+def _get_cost_totals(costs: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    totals: Dict[str, float] = {"geostores": len(costs)}
+    for prefix in ("", *(f"{flag}_" for flag in EXTENT_FLAGS)):
+        totals.update(
+            {
+                f"{prefix}tiles": 0,
+                f"{prefix}vertices": 0,
+                f"{prefix}area": 0.0,
+                f"{prefix}bytes": 0,
+            }
+        )
+    for cost in costs.values():
+        for field, value in cost.items():
+            totals[field] += value
+    return totals
+
+
+def _log_peak_rss() -> None:
+    # ru_maxrss is in kilobytes on Linux
+    own_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    workers_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    LOGGER.info(
+        f"Peak RSS {own_rss:.0f} MB, largest tiling worker {workers_rss:.0f} MB"
+    )
+
+
+def get_pending_areas() -> Iterator[Any]:
+    """
+    Request to GFW API to get list of user areas which were recently submitted and need to be added to nightly updates.
+    Areas are yielded page by page, so the full list is never held in memory.
     """
 
     LOGGER.info("Get pending Areas")
@@ -94,35 +700,75 @@ def get_pending_areas() -> List[Any]:
             f"v2/area/sync API failed with status code {sync_resp.status_code}, can't process areas"
         )
 
-    pending_areas: List[Any] = []
-    has_next_page = True
-    page_size = GEOSTORE_PAGE_SIZE
-    page_number = 1
+    page_size: int = GLOBALS.rw_areas_page_size
+    first_page: Dict[str, Any] = _get_pending_areas_page(1, page_size, headers)
+    yield from first_page["data"]
+    last_page_number: Optional[int] = _get_page_number(first_page["links"]["last"])
 
-    while has_next_page:
-        url: str = f"http://{api_prefix()}-api.globalforestwatch.org/v2/area?status=pending&all=true&page[number]={page_number}&page[size]={page_size}"
-        r: Response = requests.get(url, headers=headers)
+    if last_page_number is None:
+        LOGGER.warning(
+            f"Can't read last page number from {first_page['links']['last']}, "
+            "requesting pages one by one"
+        )
+        page_areas = first_page
+        page_number = 1
+        while page_areas["links"]["self"] != page_areas["links"]["last"]:
+            page_number += 1
+            page_areas = _get_pending_areas_page(page_number, page_size, headers)
+            yield from page_areas["data"]
+
+        return
+
+    # the first page tells us how many pages there are, so request the others
+    # concurrently, keeping only as many pages in flight as there are workers
+    LOGGER.info(f"Requesting {last_page_number} pages of pending areas")
+    max_workers: int = GLOBALS.rw_api_max_workers
+    page_numbers: Iterator[int] = iter(range(2, last_page_number + 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pages: Deque[Future] = deque(
+            executor.submit(_get_pending_areas_page, number, page_size, headers)
+            for number in itertools.islice(page_numbers, max_workers)
+        )
+        while pages:
+            page_areas = pages.popleft().result()
+            for number in itertools.islice(page_numbers, 1):
+                pages.append(
+                    executor.submit(_get_pending_areas_page, number, page_size, headers)
+                )
+            yield from page_areas["data"]
+
+
+def _get_pending_areas_page(
+    page_number: int, page_size: int, headers: Dict[str, str]
+) -> Dict[str, Any]:
+    url: str = f"http://{api_prefix()}-api.globalforestwatch.org/v2/area?status=pending&all=true&page[number]={page_number}&page[size]={page_size}"
+    r: Response = requests.get(url, headers=headers)
+
+    if r.status_code != 200:
+        raise UnexpectedResponseError(
+            f"Get areas returned response {r.status_code} on page number {page_number}"
+        )
 
-        if r.status_code != 200:
-            raise UnexpectedResponseError(
-                f"Get areas returned response {r.status_code} on page number {page_number}"
-            )
+    return r.json()
 
-        page_areas = r.json()
-        page_number += 1
-        pending_areas += page_areas["data"]
-        has_next_page = page_areas["links"]["self"] != page_areas["links"]["last"]
 
-    return pending_areas
+def _get_page_number(url: str) -> Optional[int]:
+    """
+    Get page number from a JSON:API pagination link
+    """
+    try:
+        return int(parse_qs(urlparse(url).query)["page[number]"][0])
+    except (KeyError, IndexError, ValueError):
+        return None
 
 
-def get_geostore_ids(areas: List[Any]) -> List[str]:
+def get_geostore_ids(areas: Iterable[Any]) -> List[str]:
     """
     Extract Geostore ID from user area
     """
 
     LOGGER.info("Get Geostore IDs")
-    geostore_ids: List[str] = list()
+    geostore_ids: Set[str] = set()
     error_ids = list()
     for area in areas:
         if (
@@ -136,55 +782,395 @@ def get_geostore_ids(areas: List[Any]) -> List[str]:
             if len(area["attributes"]["geostore"]) != 32:
                 error_ids.append(area["attributes"]["geostore"])
             else:
-                geostore_ids.append(area["attributes"]["geostore"])
+                geostore_ids.add(area["attributes"]["geostore"])
         else:
             LOGGER.warning(f"Cannot find geostore ID for area {area['id']} - skip")
 
-    LOGGER.info(f"IDS: {geostore_ids}")
+    LOGGER.info(f"Found {len(geostore_ids)} geostore IDs")
 
     if error_ids:
         LOGGER.info(f"Setting invalid geostore IDs to error: {error_ids}")
         update_area_statuses(error_ids, "error")
 
-    # only return unique geostore ids
-    # Return max 2000 at a time, otherwise the lambda might time out
-    remaining_ids: List[Any] = list(set(geostore_ids) - {None})[:1500]
+    # only return unique geostore ids, sorted so chunks are reproducible
+    remaining_ids: List[Any] = sorted(geostore_ids - {None})
     return remaining_ids
 
 
 def get_geostore(geostore_ids: List[str]) -> Dict[str, Any]:
     """
-    Get Geostore Geometry using list of geostore IDs
+    Get Geostore Geometry using list of geostore IDs. Geostore IDs are content hashes,
+    so geostores are cached by ID and only the ones missing from the cache are
+    requested from the RW API.
     """
 
     LOGGER.info("Get Geostore Geometries by IDs")
 
+    cached_geostores: Dict[str, Any] = _get_cached_geostores(geostore_ids)
+    missing_ids: List[str] = [
+        geostore_id
+        for geostore_id in geostore_ids
+        if geostore_id not in cached_geostores
+    ]
+    LOGGER.info(
+        f"Found {len(cached_geostores)} geostores in cache, "
+        f"requesting {len(missing_ids)} from RW API"
+    )
+
+    geostores: Dict[str, Any] = _find_geostores_by_ids(missing_ids)
+    _cache_geostores(geostores["data"])
+
+    geostores["data"] = list(cached_geostores.values()) + geostores["data"]
+    return geostores
+
+
+def _find_geostores_by_ids(geostore_ids: List[str]) -> Dict[str, Any]:
+    """
+    Request geostores from the RW API in concurrent batches. Batches failing after
+    retries are split in half until the failing geostore IDs are isolated, so a
+    single bad geostore doesn't stop the others from being processed. Batch size
+    grows while responses are fast and small, and shrinks when they are slow or
+    large. Geostores are returned in input order, skipping the failed ones.
+    """
     headers: Dict[str, str] = {"Authorization": f"Bearer {token()}"}
     url: str = (
         f"https://{api_prefix()}-api.globalforestwatch.org/v2/geostore/find-by-ids"
     )
-    geostores: Dict[str, Any] = {"data": []}
-
-    for i in range(0, len(geostore_ids), GEOSTORE_PAGE_SIZE):
-        payload: Dict[str, List[str]] = {
-            "geostores": geostore_ids[i : i + GEOSTORE_PAGE_SIZE]
-        }
-
-        retries = 0
-        while retries < 2:
-            r: Response = requests.post(url, json=payload, headers=headers)
-
-            if r.status_code != 200:
-                retries += 1
-                if retries > 1:
-                    raise UnexpectedResponseError(
-                        f"geostore/find-by-ids returned response {r.status_code} on block {i}"
+
+    batch_size: int = GEOSTORE_PAGE_SIZE
+    next_id: int = 0
+    # batches split after a failure, as (offset, IDs), sent before any new batch
+    split_batches: Deque[Tuple[int, List[str]]] = deque()
+    results: Dict[int, List[Any]] = {}
+    failed_ids: List[str] = []
+
+    with ThreadPoolExecutor(max_workers=GLOBALS.rw_api_max_workers) as executor:
+        running: Dict[Future, Tuple[int, List[str]]] = {}
+        while split_batches or next_id < len(geostore_ids) or running:
+            while len(running) < GLOBALS.rw_api_max_workers:
+                if split_batches:
+                    offset, batch = split_batches.popleft()
+                elif next_id < len(geostore_ids):
+                    offset, batch = (
+                        next_id,
+                        geostore_ids[next_id : next_id + batch_size],
                     )
-            else:
-                geostores["data"] += r.json()["data"]
-                break
+                    next_id += len(batch)
+                else:
+                    break
+                future = executor.submit(_post_geostore_batch, url, batch, headers)
+                running[future] = (offset, batch)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                offset, batch = running.pop(future)
+                try:
+                    data, latency, payload_size = future.result()
+                except UnexpectedResponseError as e:
+                    if len(batch) == 1:
+                        LOGGER.warning(f"Can't get geostore {batch[0]}: {e}")
+                        failed_ids += batch
+                        # nothing went through yet, the API is likely down
+                        if not results and len(failed_ids) >= GEOSTORE_MAX_FAILURES:
+                            raise UnexpectedResponseError(
+                                f"geostore/find-by-ids failed for geostores "
+                                f"{failed_ids} before any batch succeeded"
+                            )
+                    else:
+                        middle = len(batch) // 2
+                        split_batches.append((offset, batch[:middle]))
+                        split_batches.append((offset + middle, batch[middle:]))
+                    continue
 
-    return geostores
+                results[offset] = data
+                batch_size = _get_geostore_batch_size(
+                    batch_size, len(batch), latency, payload_size
+                )
+
+    if failed_ids and not results:
+        raise UnexpectedResponseError(
+            f"geostore/find-by-ids failed for all {len(failed_ids)} geostores"
+        )
+    elif failed_ids:
+        LOGGER.warning(
+            f"Skipping {len(failed_ids)} geostores which couldn't be requested: "
+            f"{failed_ids}"
+        )
+
+    return {"data": [g for offset in sorted(results) for g in results[offset]]}
+
+
+@retry(
+    RetryableResponseError,
+    delay=GEOSTORE_RETRY_DELAY,
+    backoff=2,
+    jitter=(0, GEOSTORE_RETRY_DELAY),
+    max_delay=GEOSTORE_RETRY_MAX_DELAY,
+    tries=GEOSTORE_RETRIES,
+)
+def _post_geostore_batch(
+    url: str, geostore_ids: List[str], headers: Dict[str, str]
+) -> Tuple[List[Any], float, int]:
+    """
+    Request a batch of geostores, returning them with the response latency in
+    seconds and the payload size in bytes. Throttled, server side and connection
+    errors are retried with exponential backoff and jitter, other errors are raised
+    at once.
+    """
+    start = time.monotonic()
+    try:
+        r: Response = requests.post(
+            url, json={"geostores": geostore_ids}, headers=headers
+        )
+    except requests.RequestException as e:
+        raise RetryableResponseError(f"geostore/find-by-ids request failed: {e}")
+    latency = time.monotonic() - start
+
+    if r.status_code == 429 or r.status_code >= 500:
+        raise RetryableResponseError(
+            f"geostore/find-by-ids returned response {r.status_code}"
+        )
+    elif r.status_code != 200:
+        raise UnexpectedResponseError(
+            f"geostore/find-by-ids returned response {r.status_code}"
+        )
+
+    return r.json()["data"], latency, len(r.content)
+
+
+def _get_geostore_batch_size(
+    batch_size: int, sent: int, latency: float, payload_size: int
+) -> int:
+    """
+    Adapt the geostore batch size to the latency and payload size of the last
+    response. Only full size batches grow the batch size.
+    """
+    if latency > GEOSTORE_TARGET_LATENCY or payload_size > GEOSTORE_MAX_PAYLOAD_SIZE:
+        return max(batch_size // 2, 1)
+    elif (
+        sent >= batch_size
+        and latency < GEOSTORE_TARGET_LATENCY / 2
+        and payload_size < GEOSTORE_MAX_PAYLOAD_SIZE / 2
+    ):
+        return min(batch_size * 2, GEOSTORE_MAX_PAGE_SIZE)
+
+    return batch_size
+
+
+def _get_cached_geostores(geostore_ids: List[str]) -> Dict[str, Any]:
+    """
+    Get geostores found in the local /tmp cache or the S3 cache, by geostore ID and
+    in input order
+    """
+    cached = _read_cached_objects(
+        [_get_geostore_cache_key(geostore_id) for geostore_id in geostore_ids]
+    )
+
+    return {
+        geostore_id: json.loads(geostore)
+        for geostore_id, geostore in zip(geostore_ids, cached)
+        if geostore is not None
+    }
+
+
+def _cache_geostores(geostores: List[Any]) -> None:
+    _write_cached_objects(
+        [
+            (_get_geostore_cache_key(g["geostoreId"]), json.dumps(g).encode("utf-8"))
+            for g in geostores
+        ]
+    )
+
+
+def _get_geostore_cache_key(geostore_id: str) -> Optional[str]:
+    # only cache IDs that are safe to use in S3 keys and file names
+    if not geostore_id.isalnum():
+        return None
+
+    return f"{GEOSTORE_CACHE_PREFIX}/{geostore_id}.json.gz"
+
+
+def _read_cached_objects(keys: List[Optional[str]]) -> List[Optional[bytes]]:
+    with ThreadPoolExecutor(max_workers=CACHE_WORKERS) as executor:
+        return list(executor.map(_read_cached_object, keys))
+
+
+def _write_cached_objects(objects: List[Tuple[Optional[str], bytes]]) -> None:
+    with ThreadPoolExecutor(max_workers=CACHE_WORKERS) as executor:
+        # consume results so errors are raised here
+        list(executor.map(lambda obj: _write_cached_object(*obj), objects))
+
+
+def _read_cached_object(key: Optional[str]) -> Optional[bytes]:
+    """
+    Read gzipped cache object from the local /tmp cache, or from S3 if it's not
+    there. Returns None if the object isn't cached or can't be read.
+    """
+    if key is None:
+        return None
+
+    local_path = os.path.join(CACHE_DIR, key)
+    try:
+        with open(local_path, "rb") as f:
+            data = gzip.decompress(f.read())
+        _LOCAL_CACHE.touch(local_path)
+        return data
+    except (OSError, EOFError):
+        pass
+
+    try:
+        response = get_s3_client().get_object(
+            Bucket=GLOBALS.s3_bucket_pipeline, Key=key
+        )
+        body: bytes = response["Body"].read()
+        data = gzip.decompress(body)
+    except ClientError as e:
+        if not is_missing_object_error(e):
+            LOGGER.warning(f"Could not read {key} from cache: {e}")
+        return None
+    except BotoCoreError as e:
+        LOGGER.warning(f"Could not read {key} from cache: {e}")
+        return None
+    except (OSError, EOFError):
+        LOGGER.warning(f"Ignoring corrupt cache object {key}")
+        return None
+
+    _write_local_cached_object(key, body)
+    return data
+
+
+def _write_cached_object(key: Optional[str], data: bytes) -> None:
+    if key is None:
+        return
+
+    body: bytes = gzip.compress(data)
+
+    try:
+        get_s3_client().put_object(
+            Body=body,
+            Bucket=GLOBALS.s3_bucket_pipeline,
+            Key=key,
+        )
+    except (BotoCoreError, ClientError) as e:
+        LOGGER.warning(f"Could not write {key} to cache: {e}")
+
+    _write_local_cached_object(key, body)
+
+
+def _write_local_cached_object(key: str, body: bytes) -> None:
+    # /tmp is small on Lambda, so the local cache is best effort
+    local_path = os.path.join(CACHE_DIR, key)
+    tmp_path = f"{local_path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, local_path)
+    except OSError:
+        LOGGER.warning(f"Could not write {key} to {local_path}")
+        return
+
+    _LOCAL_CACHE.add(local_path, len(body))
+
+
+class _LocalCache:
+    """
+    Index of the objects in the local /tmp cache, least recently used first. Warm
+    Lambdas keep /tmp across runs, so objects are evicted once the cache grows over
+    RW_AREAS_LOCAL_CACHE_SIZE. The index is built from the files in CACHE_DIR,
+    oldest first, the first time it's used.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cache_dir: Optional[str] = None
+        self.sizes: "OrderedDict[str, int]" = OrderedDict()
+        self.total_size: int = 0
+
+    def touch(self, path: str) -> None:
+        with self.lock:
+            self._load()
+            if path in self.sizes:
+                self.sizes.move_to_end(path)
+
+    def add(self, path: str, size: int) -> None:
+        with self.lock:
+            self._load()
+            self.total_size += size - self.sizes.pop(path, 0)
+            self.sizes[path] = size
+
+            while self.total_size > GLOBALS.rw_areas_local_cache_size:
+                evicted, evicted_size = self.sizes.popitem(last=False)
+                self.total_size -= evicted_size
+                try:
+                    os.remove(evicted)
+                except OSError:
+                    pass
+
+    def _load(self) -> None:
+        if self.cache_dir == CACHE_DIR:
+            return
+
+        files: List[Tuple[float, str, int]] = []
+        for dirpath, _, filenames in os.walk(CACHE_DIR):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+
+        self.cache_dir = CACHE_DIR
+        self.sizes = OrderedDict((path, size) for _, path, size in sorted(files))
+        self.total_size = sum(self.sizes.values())
+
+
+_LOCAL_CACHE = _LocalCache()
+
+
+def expire_cache() -> int:
+    """
+    Delete cached geostores and tiles older than RW_AREAS_CACHE_EXPIRATION_DAYS,
+    and tiles of other tiling versions, which are never read again once the tiling
+    version changes. Both are rebuilt on a cache miss. The pipelines bucket's
+    lifecycle rules are managed outside this repo, so this runs with the daily
+    compaction instead. Returns the number of objects deleted.
+    """
+    current_tiles: str = (
+        f"{TILE_CACHE_PREFIX}/{_get_tiling_version(_get_extent_1x1()[1])}/"
+    )
+    expired_before: datetime = datetime.now(timezone.utc) - timedelta(
+        days=GLOBALS.rw_areas_cache_expiration_days
+    )
+
+    keys: List[str] = []
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for prefix in (GEOSTORE_CACHE_PREFIX, TILE_CACHE_PREFIX):
+        for page in paginator.paginate(
+            Bucket=GLOBALS.s3_bucket_pipeline, Prefix=f"{prefix}/"
+        ):
+            keys += [
+                obj["Key"]
+                for obj in page.get("Contents", [])
+                if obj["LastModified"] < expired_before
+                or (
+                    prefix == TILE_CACHE_PREFIX
+                    and not obj["Key"].startswith(current_tiles)
+                )
+            ]
+
+    LOGGER.info(f"Deleting {len(keys)} expired cache objects")
+    # delete_objects takes up to 1000 keys per request
+    for i in range(0, len(keys), 1000):
+        response = get_s3_client().delete_objects(
+            Bucket=GLOBALS.s3_bucket_pipeline,
+            Delete={"Objects": [{"Key": key} for key in keys[i : i + 1000]]},
+        )
+        for error in response.get("Errors", []):
+            LOGGER.warning(f"Could not delete {error['Key']}: {error['Message']}")
+
+    return len(keys)
 
 
 def filter_geostores(geostores: Dict[str, Any]) -> Dict[str, Any]:
@@ -226,81 +1212,560 @@ def filter_geostores(geostores: Dict[str, Any]) -> Dict[str, Any]:
     return {"data": remaining_geostores}
 
 
-@contextmanager
-def geostore_to_wkb(geostore: Dict[str, Any]) -> Iterator[Tuple[io.StringIO, int]]:
+def _tile_geostores_with_cache(
+    geostores: List[Any],
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+    tiling_version: str,
+) -> List[Tuple[List[str], Optional[str]]]:
     """
-    Convert Geojson to WKB. Slice geometries into 1x1 degree tiles
+    Tile geostores like _tile_geostores, but tile each distinct geometry only once.
+    Many users draw the same country or protected area, which gives geostores with
+    different IDs but the same geometry. Their rows are shared, with each geostore's
+    own ID.
+
+    Rows are cached by geometry hash, without geostore ID, so geometries tiled by an
+    earlier run with the same tiling version are reused, e.g. when an area is
+    retried or the features file of a failed run was rolled back.
     """
+    hashes: List[str] = [
+        _get_geometry_hash(g) or f"geostore_{g['geostoreId']}" for g in geostores
+    ]
+    geometries: Dict[str, Any] = {}
+    for h, g in zip(hashes, geostores):
+        geometries.setdefault(h, g)
+    unique_hashes: List[str] = list(geometries)
+
+    keys = [_get_tile_cache_key(h, tiling_version) for h in unique_hashes]
+    fragments = _read_cached_objects(keys)
+    missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+    LOGGER.info(
+        f"Found {len(unique_hashes)} distinct geometries in {len(geostores)} "
+        f"geostores, tiles of {len(unique_hashes) - len(missing)} found in cache, "
+        f"tiling {len(missing)}"
+    )
 
-    LOGGER.info("Convert Geometries to WKB")
+    tiled = _tile_geostores(
+        [geometries[unique_hashes[i]] for i in missing],
+        extent_1x1,
+        tile_index,
+        _get_tiling_worker_count(),
+        _use_vectorized_tiling(),
+    )
 
-    extent_1x1: List[Tuple[Polygon, bool, bool]] = _get_extent_1x1()
-    wkb: io.StringIO = io.StringIO()
+    # rows of each geometry without geostore ID, None if it couldn't be tiled
+    geometry_rows: Dict[str, Optional[List[str]]] = {
+        h: fragment.decode("utf-8").splitlines(keepends=True)
+        for h, fragment in zip(unique_hashes, fragments)
+        if fragment is not None
+    }
+    tiled_fragments: List[Tuple[Optional[str], bytes]] = []
+    for i, (rows, error_id) in zip(missing, tiled):
+        if error_id:
+            geometry_rows[unique_hashes[i]] = None
+        else:
+            rows = [row.split("\t", 1)[1] for row in rows]
+            geometry_rows[unique_hashes[i]] = rows
+            tiled_fragments.append((keys[i], "".join(rows).encode("utf-8")))
 
-    LOGGER.info("Start writing to virtual TSV file")
-    # Column Header
-    wkb.write("geostore_id\tgeom\ttcl\tglad\n")
-    count: int = 0
+    _write_cached_objects(tiled_fragments)
 
-    # Body
+    results: List[Tuple[List[str], Optional[str]]] = []
+    for h, g in zip(hashes, geostores):
+        shared_rows = geometry_rows[h]
+        if shared_rows is None:
+            results.append(([], g["geostoreId"]))
+        else:
+            results.append(([f"{g['geostoreId']}\t{row}" for row in shared_rows], None))
+
+    return results
+
+
+def _get_geometry_hash(g: Dict[str, Any]) -> Optional[str]:
+    """
+    Hash of the normalized geostore geometry, so the same geometry drawn with a
+    different ring start or orientation has the same hash. None if the geometry
+    can't be read.
+    """
     try:
-        error_ids = []
-        for g in geostore["data"]:
-            LOGGER.info(f"Processing geostore {g['geostoreId']}")
-
-            try:
-                raw_geom = g["geostore"]["data"]["attributes"]["geojson"]["features"][
-                    0
-                ]["geometry"]
-
-                if raw_geom["type"] != "Polygon" and raw_geom["type"] != "MultiPolygon":
-                    LOGGER.warning(f"Invalid geometry type {g['geostoreId']}: {raw_geom['type'] }")
-                    error_ids.append(g["geostoreId"])
-                    continue
+        geom = shape(
+            g["geostore"]["data"]["attributes"]["geojson"]["features"][0]["geometry"]
+        )
+    except Exception:
+        return None
 
-                geom: Polygon = shape(raw_geom)
-
-                # dilate geometry to remove any slivers or other possible small artifacts that might cause issues
-                # in geotrellis
-                # https://gis.stackexchange.com/questions/120286/removing-small-polygon-gaps-in-shapely-polygon
-                geom = geom.buffer(0.0001).buffer(-0.0001)
-
-                # if GEOS thinks geom is invalid, try calling buffer(0) to rewrite it without changing the geometry
-                if not geom.is_valid:
-                    geom = geom.buffer(0)
-                    if (
-                        not geom.is_valid
-                    ):  # is still invalid, we'll need to look into this, but skip for now
-                        LOGGER.warning(
-                            f"Invalid geometry {g['geostoreId']}: {geom.wkt}"
-                        )
-                        error_ids.append(g["geostoreId"]["data"]["id"])
-                        continue
-
-                for tile in extent_1x1:
-                    if geom.intersects(tile[0]):
-                        LOGGER.info(
-                            f"Feature {g['geostoreId']} intersects with bounds {tile[0].bounds} -> add to WKB"
-                        )
-                        intersecting_polygon = _get_intersecting_polygon(geom, tile[0])
-
-                        if intersecting_polygon:
-                            wkb.write(
-                                f"{g['geostoreId']}\t{dumps(intersecting_polygon, hex=True)}\t{tile[1]}\t{tile[2]}\n"
-                            )
-                            count += 1
-            except Exception as e:
-                LOGGER.error(f"Error processing geostore {g['geostoreId']}")
-                raise e
+    if VECTORIZED_TILING_AVAILABLE:
+        geom = shapely.normalize(geom)
+    else:
+        geom = _normalize_polygonal(geom)
 
-        if error_ids:
-            LOGGER.info(f"Setting invalid geostore IDs to error: {error_ids}")
-            update_area_statuses(error_ids, "error")
+    return hashlib.sha1(geom.wkb).hexdigest()
 
-        yield (wkb, count)
 
+def _normalize_polygonal(geom):
+    """
+    Canonical form of a Polygon or MultiPolygon for shapely 1.8, which has no
+    shapely.normalize: exteriors clockwise and holes counterclockwise, each ring
+    starting at its lowest vertex, and holes and parts sorted. Other geometries are
+    returned as they are. Hashes differ from those of shapely.normalize.
+    """
+    if geom.geom_type == "MultiPolygon":
+        return MultiPolygon(
+            sorted((_normalize_polygonal(p) for p in geom.geoms), key=lambda p: p.wkb)
+        )
+    if geom.geom_type != "Polygon" or geom.is_empty:
+        return geom
+
+    geom = orient(geom, sign=-1.0)
+    return Polygon(
+        _rotate_ring(geom.exterior.coords),
+        sorted(_rotate_ring(interior.coords) for interior in geom.interiors),
+    )
+
+
+def _rotate_ring(coords) -> List[Tuple[float, ...]]:
+    """Vertices of a closed ring, without the closing vertex, from the lowest one"""
+    vertices = list(coords)[:-1]
+    start = vertices.index(min(vertices))
+    return vertices[start:] + vertices[:start]
+
+
+def _get_tiling_version(extent_etag: str) -> str:
+    """
+    Version of the tiling output, which changes with the extent grid and with how
+    geometries are tiled
+    """
+    grid_version = extent_etag.strip('"')
+    version = f"v{TILE_CACHE_VERSION}/{grid_version}"
+
+    if GLOBALS.rw_areas_geometry_repair != "buffer":
+        version += f"/{GLOBALS.rw_areas_geometry_repair}"
+    if GLOBALS.rw_areas_max_vertices is not None:
+        version += (
+            f"/simplify_{GLOBALS.rw_areas_max_vertices}"
+            f"_{GLOBALS.rw_areas_max_simplify_tolerance}"
+        )
+
+    return version
+
+
+def _get_tile_cache_key(geometry_hash: str, tiling_version: str) -> Optional[str]:
+    if not geometry_hash.isalnum():
+        return None
+
+    return f"{TILE_CACHE_PREFIX}/{tiling_version}/{geometry_hash}.tsv.gz"
+
+
+def _get_tiling_worker_count() -> int:
+    return GLOBALS.rw_areas_tiling_workers or os.cpu_count() or 1
+
+
+def _use_vectorized_tiling() -> bool:
+    if GLOBALS.rw_areas_vectorized_tiling and not VECTORIZED_TILING_AVAILABLE:
+        LOGGER.warning(
+            f"Vectorized tiling needs shapely 2, found {shapely.__version__}. "
+            "Falling back to tiling one geostore at a time."
+        )
+        return False
+
+    return GLOBALS.rw_areas_vectorized_tiling
+
+
+def _tile_geostores(
+    geostores: List[Any],
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+    worker_count: int = 1,
+    vectorized: bool = False,
+) -> List[Tuple[List[str], Optional[str]]]:
+    """
+    Tile geostores, returning TSV rows and error ID for each geostore in input order.
+    Geostores are independent, so with more than one worker they are spread round-robin
+    across worker processes and the results put back in input order.
+    """
+    worker_count = min(worker_count, len(geostores))
+    if worker_count <= 1:
+        return _tile_geostore_batch(geostores, extent_1x1, tile_index, vectorized)
+
+    LOGGER.info(f"Tiling {len(geostores)} geostores with {worker_count} processes")
+
+    # Lambda has no /dev/shm, so multiprocessing.Pool and Queue don't work there.
+    # Use plain processes that send their results back through a pipe instead.
+    workers = []
+    for i in range(worker_count):
+        recv_conn, send_conn = Pipe(duplex=False)
+        process = Process(
+            target=_tile_geostores_worker,
+            args=(
+                geostores[i::worker_count],
+                extent_1x1,
+                tile_index,
+                vectorized,
+                send_conn,
+            ),
+        )
+        process.start()
+        send_conn.close()
+        workers.append((process, recv_conn))
+
+    worker_results = []
+    try:
+        for process, recv_conn in workers:
+            # receive before joining, otherwise a worker with a full pipe never exits
+            failed, result = recv_conn.recv()
+            recv_conn.close()
+            process.join()
+
+            if failed:
+                raise Exception(f"Geostore tiling process failed:\n{result}")
+            worker_results.append(result)
+    finally:
+        # stop the other workers if one failed or died, so they don't keep running
+        # into the next invocation of a warm Lambda
+        for process, recv_conn in workers:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            recv_conn.close()
+
+    return [
+        worker_results[i % worker_count][i // worker_count]
+        for i in range(len(geostores))
+    ]
+
+
+def _tile_geostores_worker(
+    geostores, extent_1x1, tile_index, vectorized, send_conn
+) -> None:
+    try:
+        send_conn.send(
+            (
+                False,
+                _tile_geostore_batch(geostores, extent_1x1, tile_index, vectorized),
+            )
+        )
+    except Exception:
+        send_conn.send((True, traceback.format_exc()))
     finally:
-        wkb.close()
+        send_conn.close()
+
+
+def _tile_geostore_batch(
+    geostores: List[Any],
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+    vectorized: bool,
+) -> List[Tuple[List[str], Optional[str]]]:
+    if vectorized and VECTORIZED_TILING_AVAILABLE:
+        return _tile_geostores_vectorized(geostores, extent_1x1, tile_index)
+
+    return [_tile_geostore(g, extent_1x1, tile_index) for g in geostores]
+
+
+def _tile_geostore(
+    g: Dict[str, Any],
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+) -> Tuple[List[str], Optional[str]]:
+    """
+    Clean and validate geostore geometry, and slice into TSV rows for each 1x1 tile it
+    intersects. Returns the geostore ID as error ID if the geometry can't be used.
+    """
+    LOGGER.info(f"Processing geostore {g['geostoreId']}")
+    rows: List[str] = []
+
+    try:
+        geom, error_id = _get_clean_geometry(g)
+        if error_id:
+            return rows, error_id
+
+        for tile, tcl, glad, contained in _get_intersecting_tiles(
+            geom, extent_1x1, tile_index
+        ):
+            LOGGER.info(
+                f"Feature {g['geostoreId']} intersects with bounds {tile.bounds} -> add to WKB"
+            )
+
+            # the intersection of a tile fully inside the geometry is just the tile,
+            # so only clip tiles on the geometry boundary
+            if contained:
+                intersecting_polygon = tile
+            else:
+                intersecting_polygon = _get_intersecting_polygon(geom, tile)
+
+            if intersecting_polygon:
+                rows.append(
+                    f"{g['geostoreId']}\t{dumps(intersecting_polygon, hex=True)}\t{tcl}\t{glad}\t{get_tile_id(tile)}\n"
+                )
+    except Exception as e:
+        LOGGER.error(f"Error processing geostore {g['geostoreId']}")
+        raise e
+
+    return rows, None
+
+
+def _tile_geostores_vectorized(
+    geostores: List[Any],
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+) -> List[Tuple[List[str], Optional[str]]]:
+    """
+    Same as tiling each geostore with _tile_geostore, but collects every candidate
+    (geostore, tile) pair first and runs the predicates, clipping and WKB encoding
+    as shapely 2 array operations instead of one Python call per pair.
+    """
+    results: List[Tuple[List[str], Optional[str]]] = []
+    pair_geoms: List[Any] = []
+    pair_results: List[int] = []
+    pair_tiles: List[int] = []
+
+    for g in geostores:
+        LOGGER.info(f"Processing geostore {g['geostoreId']}")
+        try:
+            geom, error_id = _get_clean_geometry(g)
+        except Exception as e:
+            LOGGER.error(f"Error processing geostore {g['geostoreId']}")
+            raise e
+
+        results.append(([], error_id))
+        if error_id or geom.is_empty:
+            continue
+
+        candidates: Set[int] = set()
+        for cell in _get_cells(geom.bounds):
+            candidates.update(tile_index.get(cell, []))
+
+        shapely.prepare(geom)
+        pair_geoms += [geom] * len(candidates)
+        pair_results += [len(results) - 1] * len(candidates)
+        pair_tiles += sorted(candidates)
+
+    if not pair_tiles:
+        return results
+
+    pair_geom_array = np.empty(len(pair_geoms), dtype=object)
+    pair_geom_array[:] = pair_geoms
+    pair_tile_array = np.empty(len(pair_tiles), dtype=object)
+    pair_tile_array[:] = [extent_1x1[i][0] for i in pair_tiles]
+    pair_results_array = np.array(pair_results)
+    pair_tiles_array = np.array(pair_tiles)
+
+    intersects = shapely.intersects(pair_geom_array, pair_tile_array)
+    pair_results_array = pair_results_array[intersects]
+    pair_tiles_array = pair_tiles_array[intersects]
+    pair_geom_array = pair_geom_array[intersects]
+    pair_tile_array = pair_tile_array[intersects]
+
+    # contained tiles are their own intersection, only clip boundary tiles
+    polygons = pair_tile_array.copy()
+    boundary = ~shapely.contains(pair_geom_array, pair_tile_array)
+    polygons[boundary] = [
+        _get_polygonal(intersection)
+        for intersection in shapely.intersection(
+            pair_geom_array[boundary], pair_tile_array[boundary]
+        )
+    ]
+
+    has_polygon = shapely.is_geometry(polygons) & ~shapely.is_empty(polygons)
+    hex_wkbs = shapely.to_wkb(polygons[has_polygon], hex=True)
+
+    for i, tile_i, hex_wkb in zip(
+        pair_results_array[has_polygon], pair_tiles_array[has_polygon], hex_wkbs
+    ):
+        tile, tcl, glad = extent_1x1[tile_i]
+        results[i][0].append(
+            f"{geostores[i]['geostoreId']}\t{hex_wkb}\t{tcl}\t{glad}\t{get_tile_id(tile)}\n"
+        )
+
+    return results
+
+
+def _get_clean_geometry(g: Dict[str, Any]) -> Tuple[Any, Optional[str]]:
+    """
+    Get geostore geometry, cleaned of slivers and made valid. Returns the geostore ID
+    as error ID instead if the geometry can't be used.
+    """
+    raw_geom = g["geostore"]["data"]["attributes"]["geojson"]["features"][0]["geometry"]
+
+    if raw_geom["type"] != "Polygon" and raw_geom["type"] != "MultiPolygon":
+        LOGGER.warning(f"Invalid geometry type {g['geostoreId']}: {raw_geom['type'] }")
+        return None, g["geostoreId"]
+
+    geom: Polygon = shape(raw_geom)
+    geom = _simplify_geometry(geom, g["geostoreId"])
+
+    if GLOBALS.rw_areas_geometry_repair == "make_valid":
+        geom = _repair_geometry(geom)
+    else:
+        geom = _buffer_geometry(geom)
+
+    if geom is None or not geom.is_valid:
+        # is still invalid, we'll need to look into this, but skip for now
+        LOGGER.warning(f"Invalid geometry {g['geostoreId']}: {geom and geom.wkt}")
+        return None, g["geostoreId"]
+
+    return geom, None
+
+
+def _buffer_geometry(geom: Any) -> Any:
+    # dilate geometry to remove any slivers or other possible small artifacts that might cause issues
+    # in geotrellis
+    # https://gis.stackexchange.com/questions/120286/removing-small-polygon-gaps-in-shapely-polygon
+    geom = geom.buffer(SLIVER_WIDTH).buffer(-SLIVER_WIDTH)
+
+    # if GEOS thinks geom is invalid, try calling buffer(0) to rewrite it without changing the geometry
+    if not geom.is_valid:
+        geom = geom.buffer(0)
+
+    return geom
+
+
+def _repair_geometry(geom: Any) -> Optional[Any]:
+    """
+    Repair geometry with make_valid and snap it to a fine precision grid, and only
+    use the double buffer if it could change the geometry. Returns None if nothing
+    polygonal is left.
+    """
+    if not geom.is_valid:
+        geom = _get_polygonal(make_valid(geom))
+        if geom is None:
+            return None
+
+    if VECTORIZED_TILING_AVAILABLE:
+        geom = _get_polygonal(shapely.set_precision(geom, REPAIR_GRID_SIZE))
+        if geom is None:
+            return None
+
+    if _has_slivers(geom):
+        geom = _buffer_geometry(geom)
+
+    return geom
+
+
+def _has_slivers(geom: Any) -> bool:
+    """
+    Whether the double buffer could change the geometry: it closes holes and gaps
+    between polygons narrower than twice the sliver width. Hole width is estimated
+    as twice its area over its perimeter, the width of a long thin rectangle.
+    Notches in exterior rings aren't detected.
+    """
+    polygons = list(geom.geoms) if geom.geom_type == "MultiPolygon" else [geom]
+
+    for polygon in polygons:
+        for ring in polygon.interiors:
+            hole = Polygon(ring)
+            if hole.area < SLIVER_WIDTH * hole.length:
+                return True
+
+    return len(polygons) > 1 and _has_narrow_gaps(polygons)
+
+
+def _has_narrow_gaps(polygons: List[Polygon]) -> bool:
+    gap_width: float = 2 * SLIVER_WIDTH
+
+    if VECTORIZED_TILING_AVAILABLE:
+        tree = shapely.STRtree(polygons)
+        left, right = tree.query(polygons, predicate="dwithin", distance=gap_width)
+        return bool(np.any(left != right))
+
+    for i, polygon in enumerate(polygons):
+        for other in polygons[i + 1 :]:
+            if polygon.distance(other) < gap_width:
+                return True
+
+    return False
+
+
+def _simplify_geometry(geom: Any, geostore_id: str) -> Any:
+    """
+    Simplify geometries with more vertices than the budget, preserving topology.
+    The tolerance starts at an eighth of the maximum tolerance, which is kept below
+    the raster pixel size, and doubles until the geometry fits the budget.
+    """
+    max_vertices: Optional[int] = GLOBALS.rw_areas_max_vertices
+    vertex_count: int = _get_vertex_count(geom)
+    if max_vertices is None or vertex_count <= max_vertices:
+        return geom
+
+    max_tolerance: float = GLOBALS.rw_areas_max_simplify_tolerance
+    tolerance: float = max_tolerance / 8
+    while True:
+        simplified = geom.simplify(tolerance, preserve_topology=True)
+        simplified_count = _get_vertex_count(simplified)
+        if simplified_count <= max_vertices or tolerance >= max_tolerance:
+            break
+        tolerance = min(tolerance * 2, max_tolerance)
+
+    LOGGER.info(
+        f"Simplified geostore {geostore_id} from {vertex_count} to "
+        f"{simplified_count} vertices with tolerance {tolerance}"
+    )
+    return simplified
+
+
+def _get_vertex_count(geom: Any) -> int:
+    polygons = geom.geoms if geom.geom_type == "MultiPolygon" else [geom]
+    return sum(
+        len(ring.coords)
+        for polygon in polygons
+        for ring in [polygon.exterior, *polygon.interiors]
+    )
+
+
+def _get_tile_index(
+    extent_1x1: List[Tuple[Polygon, bool, bool]]
+) -> Dict[Tuple[int, int], List[int]]:
+    """
+    Index extent tiles by the integer 1x1 degree cells their (closed) bounds touch,
+    so candidate tiles for a geometry can be looked up from its bounds instead of
+    testing every tile in the extent file
+    """
+    tile_index: Dict[Tuple[int, int], List[int]] = dict()
+
+    for i, (tile, _, _) in enumerate(extent_1x1):
+        for cell in _get_cells(tile.bounds):
+            tile_index.setdefault(cell, []).append(i)
+
+    return tile_index
+
+
+def _get_cells(bounds: Tuple[float, float, float, float]) -> Iterator[Tuple[int, int]]:
+    """
+    Integer grid cells covered by closed bounds. Two closed boxes intersect only if
+    they share at least one of these cells.
+    """
+    min_x, min_y, max_x, max_y = bounds
+    for x in range(math.floor(min_x), math.floor(max_x) + 1):
+        for y in range(math.floor(min_y), math.floor(max_y) + 1):
+            yield x, y
+
+
+def _get_intersecting_tiles(
+    geom,
+    extent_1x1: List[Tuple[Polygon, bool, bool]],
+    tile_index: Dict[Tuple[int, int], List[int]],
+) -> List[Tuple[Polygon, bool, bool, bool]]:
+    """
+    Get extent tiles intersecting geometry, in extent file order, with a flag for
+    whether the tile is fully contained in the geometry. Only tiles sharing a grid
+    cell with the geometry bounds are tested, using the prepared geometry so
+    disjoint, contained and boundary tiles can be told apart cheaply.
+    """
+    if geom.is_empty:
+        return []
+
+    candidates: Set[int] = set()
+    for cell in _get_cells(geom.bounds):
+        candidates.update(tile_index.get(cell, []))
+
+    prepared_geom = prep(geom)
+    tiles: List[Tuple[Polygon, bool, bool, bool]] = []
+    for i in sorted(candidates):
+        tile, tcl, glad = extent_1x1[i]
+        if prepared_geom.intersects(tile):
+            tiles.append((tile, tcl, glad, prepared_geom.contains(tile)))
+
+    return tiles
 
 
 def _get_intersecting_polygon(feature_geom, tile_geom):
@@ -309,12 +1774,24 @@ def _get_intersecting_polygon(feature_geom, tile_geom):
     or returns None if the intersection contains no polygons.
     """
 
-    intersection = feature_geom.intersection(tile_geom)
+    return _get_polygonal(feature_geom.intersection(tile_geom))
+
+
+def _get_polygonal(intersection):
+    """
+    Get Polygon or MultiPolygon part of an intersection, or None if it contains no
+    polygons.
+    """
 
-    if intersection.type == "Polygon" or intersection.type == "MultiPolygon":
+    if intersection.geom_type == "Polygon" or intersection.geom_type == "MultiPolygon":
         return intersection
-    elif intersection.type == "GeometryCollection":
-        polygons = [geom for geom in intersection.geoms if geom.type == "Polygon"]
+    elif intersection.geom_type == "GeometryCollection":
+        polygons = []
+        for geom in intersection.geoms:
+            if geom.geom_type == "Polygon":
+                polygons.append(geom)
+            elif geom.geom_type == "MultiPolygon":
+                polygons += geom.geoms
 
         if len(polygons) == 1:
             return polygons[0]
@@ -326,15 +1803,27 @@ def _get_intersecting_polygon(feature_geom, tile_geom):
         return None
 
 
-def _get_extent_1x1() -> List[Tuple[Polygon, bool, bool]]:
+def _get_extent_1x1() -> Tuple[List[Tuple[Polygon, bool, bool]], str]:
     """
-    Fetch 1x1 degree extent file
+    Fetch 1x1 degree extent file and its ETag. A compact copy is cached in /tmp and
+    reused across warm Lambda invocations, as long as the ETag of the extent file
+    hasn't changed.
     """
     LOGGER.info("Fetch Extent File")
     result_bucket = os.environ["S3_BUCKET_PIPELINE"]
+    head: Dict[str, Any] = get_s3_client().head_object(
+        Bucket=result_bucket,
+        Key=EXTENT_1X1_KEY,
+    )
+
+    cached_extent_1x1 = _read_extent_1x1_cache(head["ETag"])
+    if cached_extent_1x1 is not None:
+        LOGGER.info(f"Using cached extent file {EXTENT_1X1_CACHE}")
+        return cached_extent_1x1, head["ETag"]
+
     response: Dict[str, Any] = get_s3_client().get_object(
         Bucket=result_bucket,
-        Key="geotrellis/features/extent_1x1.geojson",
+        Key=EXTENT_1X1_KEY,
     )
 
     glad_tiles: Dict[str, Any] = json.load(response["Body"])
@@ -349,24 +1838,72 @@ def _get_extent_1x1() -> List[Tuple[Polygon, bool, bool]]:
             (geom, feature["properties"]["tcl"], feature["properties"]["glad"])
         )
 
-    return extent_1x1
+    # the compact form only keeps tile bounds, so only use it for a grid of boxes
+    if all(
+        geom.equals(box(*geom.bounds)) and type(tcl) is bool and type(glad) is bool
+        for geom, tcl, glad in extent_1x1
+    ):
+        bounds = np.array([geom.bounds for geom, _, _ in extent_1x1], dtype=np.float64)
+        tcl_bits = np.packbits([tcl for _, tcl, _ in extent_1x1])
+        glad_bits = np.packbits([glad for _, _, glad in extent_1x1])
+
+        _write_extent_1x1_cache(response["ETag"], bounds, tcl_bits, glad_bits)
+        extent_1x1 = _get_extent_1x1_from_arrays(bounds, tcl_bits, glad_bits)
+    else:
+        LOGGER.warning("Extent file is not a grid of boxes, not caching it")
+
+    return extent_1x1, response["ETag"]
 
 
-def get_aoi_geostore_ids(aoi_src: str) -> Set[str]:
-    geostore_ids = set()
-    aoi_bucket, aoi_key = get_s3_path_parts(aoi_src)
+def _read_extent_1x1_cache(etag: str) -> Optional[List[Tuple[Polygon, bool, bool]]]:
+    """
+    Read the cached extent grid, or None if it's missing or for another ETag. A
+    truncated or corrupt cache is deleted, so it gets rebuilt.
+    """
+    try:
+        with np.load(EXTENT_1X1_CACHE) as cache:
+            if str(cache["etag"]) != etag:
+                return None
+            return _get_extent_1x1_from_arrays(
+                cache["bounds"], cache["tcl"], cache["glad"]
+            )
+    except FileNotFoundError:
+        return None
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        LOGGER.warning(f"Deleting unreadable extent cache {EXTENT_1X1_CACHE}")
+        try:
+            os.remove(EXTENT_1X1_CACHE)
+        except OSError:
+            pass
+        return None
 
-    with io.BytesIO() as data:
-        get_s3_client().download_fileobj(aoi_bucket, aoi_key, data)
 
-        rows = data.getvalue().decode("utf-8").split("\n")
+def _write_extent_1x1_cache(
+    etag: str, bounds: np.ndarray, tcl: np.ndarray, glad: np.ndarray
+) -> None:
+    # write to a temporary file first, so a concurrent reader never sees a partial cache
+    tmp_path = f"{EXTENT_1X1_CACHE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, etag=np.array(etag), bounds=bounds, tcl=tcl, glad=glad)
+        os.replace(tmp_path, EXTENT_1X1_CACHE)
+    except OSError:
+        LOGGER.warning(f"Could not cache extent file to {EXTENT_1X1_CACHE}")
 
-    first = True
-    for row in rows:
-        geostore_id = row.split("\t")[0]
-        if first:
-            first = False
-        elif geostore_id:
-            geostore_ids.add(geostore_id)
 
-    return geostore_ids
+def _get_extent_1x1_from_arrays(
+    bounds: np.ndarray, tcl: np.ndarray, glad: np.ndarray
+) -> List[Tuple[Polygon, bool, bool]]:
+    """
+    Build extent tiles from an (n, 4) array of tile bounds and tcl/glad flags packed
+    into bit arrays.
+    """
+    count = len(bounds)
+    return [
+        (box(*tile_bounds), bool(tile_tcl), bool(tile_glad))
+        for tile_bounds, tile_tcl, tile_glad in zip(
+            bounds.tolist(),
+            np.unpackbits(tcl, count=count).tolist(),
+            np.unpackbits(glad, count=count).tolist(),
+        )
+    ]
@@ -0,0 +1,235 @@
+import io
+import json
+import tempfile
+from typing import Any, Dict, List, Optional, Set
+
+from ..clients.aws import (
+    MultipartUploadWriter,
+    get_s3_client,
+    get_s3_path,
+    get_s3_path_parts,
+)
+from ..globals import GLOBALS, LOGGER
+from ..util.features import (
+    COMPACTED_FEATURES_MANIFEST_KEY,
+    COMPACTED_FEATURES_PARTS_PREFIX,
+    TSV_HEADER,
+    TileSortedWriter,
+    get_aoi_geostore_ids,
+    get_compacted_features_manifest,
+    get_compacted_features_src,
+    get_features_format,
+    get_features_ids_path,
+    get_features_index_path,
+    get_features_path,
+    get_features_writer,
+    iter_features_rows,
+    list_geostore_features,
+    write_features_sidecars,
+)
+
+
+def compact_features(version: str) -> Optional[str]:
+    """
+    Merge the nightly user area features files into a few large parts of about
+    RW_AREAS_COMPACTED_PART_SIZE bytes, sorted by tile. Only nightly files added
+    since the last compaction are read, at most RW_AREAS_COMPACTED_MAX_SOURCES
+    per run and oldest first, together with the last part if it isn't full yet,
+    so full parts are never rewritten. Rows of geostores already in a full part,
+    or in a newer file, are dropped. Writes a manifest of the parts, which the 1x1
+    asset of geostore points to while it covers all nightly files.
+
+    New parts are named after the run, so they never replace a part of the
+    published manifest, and readers only read the parts it lists. Parts it no
+    longer lists are deleted by the next run, after jobs reading them are done.
+    Returns the path of the parts, None if there is nothing to compact.
+    """
+    previous: Optional[Dict[str, Any]] = get_compacted_features_manifest()
+    merged: List[str] = previous["sources"] if previous else []
+    _delete_unlisted_parts(previous["parts"] if previous else [])
+
+    # nightly files are named after their sync version, vYYYYMMDD, oldest first
+    new_sources: List[str] = sorted(set(list_geostore_features()) - set(merged))
+    if not new_sources:
+        LOGGER.info("No new features files to compact")
+        return get_compacted_features_src(previous) if previous else None
+
+    sources: List[str] = new_sources[: GLOBALS.rw_areas_compacted_max_sources]
+    if len(sources) < len(new_sources):
+        LOGGER.info(
+            f"Leaving {len(new_sources) - len(sources)} features files for the "
+            "next compaction runs"
+        )
+
+    full_parts: List[Dict[str, Any]] = []
+    open_part: Optional[Dict[str, Any]] = None
+    if previous:
+        full_parts = previous["parts"]
+        if full_parts[-1]["bytes"] < GLOBALS.rw_areas_compacted_part_size:
+            *full_parts, open_part = full_parts
+
+    LOGGER.info(f"Compacting {len(sources)} features files")
+    compacted_ids: Set[bytes] = set()
+    for part in full_parts:
+        compacted_ids |= {
+            geostore_id.encode("utf-8")
+            for geostore_id in get_aoi_geostore_ids(part["src"])
+        }
+
+    keys: List[str] = sorted(sources, reverse=True)
+    if open_part:
+        keys.append(get_s3_path_parts(open_part["src"])[1])
+
+    # rows are sorted locally, then split into parts between tiles
+    with tempfile.TemporaryFile(dir="/tmp") as sorted_rows:
+        with TileSortedWriter(sorted_rows) as tsv:
+            row_count = _write_deduplicated_rows(keys, tsv, compacted_ids)
+
+        run: int = previous.get("run", 0) + 1 if previous else 0
+        parts = full_parts + _upload_compacted_parts(
+            f"{version}_{run:04}",
+            get_features_format(),
+            sorted_rows,
+            tsv.index,
+            len(full_parts),
+        )
+
+    if not parts:
+        LOGGER.info("No rows to compact")
+        return None
+
+    manifest: Dict[str, Any] = {
+        "version": version,
+        "run": run,
+        "sources": sorted(merged + sources),
+        "parts": parts,
+        "totals": {
+            field: sum(part[field] for part in parts)
+            for field in ("geostores", "rows", "bytes")
+        },
+    }
+    get_s3_client().put_object(
+        Body=json.dumps(manifest).encode("utf-8"),
+        Bucket=GLOBALS.s3_bucket_pipeline,
+        Key=COMPACTED_FEATURES_MANIFEST_KEY,
+    )
+
+    LOGGER.info(
+        f"Compacted {row_count} rows of {len(sources)} features files, "
+        f"{len(parts)} parts in total"
+    )
+    return get_compacted_features_src(manifest)
+
+
+def _write_deduplicated_rows(
+    keys: List[str], tsv: io.IOBase, seen: Optional[Set[bytes]] = None
+) -> int:
+    """
+    Write the rows of the features files, in order. Rows of geostores in seen or
+    already written from a previous file are skipped, seen is updated with the
+    geostores written. Returns the number of rows written.
+    """
+    tsv.write(TSV_HEADER.encode("utf-8"))
+
+    count: int = 0
+    seen = seen if seen is not None else set()
+    for key in keys:
+        current: Set[bytes] = set()
+        for row in iter_features_rows(key):
+            geostore_id = row[: row.index(b"\t")]
+            if geostore_id in seen:
+                continue
+
+            current.add(geostore_id)
+            tsv.write(row)
+            count += 1
+
+        seen.update(current)
+
+    return count
+
+
+def _upload_compacted_parts(
+    run: str,
+    features_format: str,
+    sorted_rows: io.IOBase,
+    index: Dict[str, List[int]],
+    first_part: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Upload sorted rows as parts of about RW_AREAS_COMPACTED_PART_SIZE bytes,
+    splitting between tiles. Parts are named after the run and numbered from
+    first_part.
+    """
+    if not index:
+        return []
+
+    tile_groups: List[List[str]] = [[]]
+    group_size: int = 0
+    for tile_id, (_, _, _, tile_length) in index.items():
+        if group_size >= GLOBALS.rw_areas_compacted_part_size:
+            tile_groups.append([])
+            group_size = 0
+        tile_groups[-1].append(tile_id)
+        group_size += tile_length
+
+    parts: List[Dict[str, Any]] = []
+    for i, tile_ids in enumerate(tile_groups, first_part):
+        first_row, _, offset, _ = index[tile_ids[0]]
+        last_row, last_count, last_offset, last_length = index[tile_ids[-1]]
+        length: int = last_offset + last_length - offset
+
+        path = get_features_path(
+            f"{COMPACTED_FEATURES_PARTS_PREFIX}/{run}_{i:03}", features_format
+        )
+        with MultipartUploadWriter(GLOBALS.s3_bucket_pipeline, path) as upload:
+            with get_features_writer(
+                upload, features_format
+            ) as features, TileSortedWriter(features) as tsv:
+                tsv.write(TSV_HEADER.encode("utf-8"))
+                sorted_rows.seek(offset)
+                while length:
+                    chunk = sorted_rows.read(
+                        min(length, MultipartUploadWriter.PART_SIZE)
+                    )
+                    tsv.write(chunk)
+                    length -= len(chunk)
+
+        src = get_s3_path(GLOBALS.s3_bucket_pipeline, path)
+        write_features_sidecars(src, tsv)
+        parts.append(
+            {
+                "src": src,
+                "geostores": len(tsv.geostore_ids),
+                "rows": last_row + last_count - first_row,
+                "bytes": last_offset + last_length - offset,
+            }
+        )
+
+    return parts
+
+
+def _delete_unlisted_parts(parts: List[Dict[str, Any]]) -> None:
+    """
+    Delete compacted parts missing from the manifest: open parts the last run
+    rewrote, and parts of runs which failed before writing their manifest
+    """
+    listed: Set[str] = {get_s3_path_parts(part["src"])[1] for part in parts}
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=GLOBALS.s3_bucket_pipeline, Prefix=f"{COMPACTED_FEATURES_PARTS_PREFIX}/"
+    ):
+        for obj in page.get("Contents", []):
+            if obj["Key"] not in listed:
+                LOGGER.info(f"Deleting compacted part {obj['Key']}")
+                _delete_features(get_s3_path(GLOBALS.s3_bucket_pipeline, obj["Key"]))
+
+
+def _delete_features(features_src: str) -> None:
+    for path in (
+        features_src,
+        get_features_index_path(features_src),
+        get_features_ids_path(features_src),
+    ):
+        bucket, key = get_s3_path_parts(path)
+        get_s3_client().delete_object(Bucket=bucket, Key=key)
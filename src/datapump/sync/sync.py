@@ -840,9 +840,9 @@ class DISTAlertsSync(Sync):
         return jobs
 
 class RWAreasSync(Sync):
-    def __init__(self, sync_version: str):
+    def __init__(self, sync_version: str, deadline: Optional[float] = None):
         self.sync_version = sync_version
-        self.features_1x1 = create_1x1_tsv(sync_version)
+        self.features_1x1 = create_1x1_tsv(sync_version, deadline)
 
     def build_jobs(self, config: DatapumpConfig) -> List[Job]:
         if self.features_1x1:
@@ -884,12 +884,25 @@ class Syncer:
         SyncType.umd_glad_dist_alerts: DISTAlertsSync,
     }
 
-    def __init__(self, sync_types: List[SyncType], sync_version: str = None):
+    def __init__(
+        self,
+        sync_types: List[SyncType],
+        sync_version: str = None,
+        deadline: Optional[float] = None,
+    ):
+        """
+        :param deadline: time.monotonic() value by which user areas must be tiled,
+            so their features are written before the Lambda times out
+        """
         self.sync_version: str = (
             sync_version if sync_version else self._get_latest_version()
         )
         self.syncers: Dict[SyncType, Sync] = {
-            sync_type: self.SYNCERS[sync_type](self.sync_version)
+            sync_type: (
+                RWAreasSync(self.sync_version, deadline)
+                if sync_type == SyncType.rw_areas
+                else self.SYNCERS[sync_type](self.sync_version)
+            )
             for sync_type in sync_types
         }
 
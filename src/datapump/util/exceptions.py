@@ -6,6 +6,10 @@ class UnexpectedResponseError(Exception):
     pass
 
 
+class RetryableResponseError(UnexpectedResponseError):
+    pass
+
+
 class DataApiResponseError(Exception):
     pass
 
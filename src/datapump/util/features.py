@@ -0,0 +1,469 @@
+import abc
+import gzip
+import io
+import json
+import math
+import os
+import tempfile
+from array import array
+from contextlib import nullcontext
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from botocore.exceptions import ClientError
+from shapely.geometry import Polygon, box
+from shapely.wkb import loads
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed to write features as GeoParquet
+    pa = pq = None
+
+from ..clients.aws import (
+    get_s3_client,
+    get_s3_path,
+    get_s3_path_parts,
+    is_missing_object_error,
+)
+from ..globals import GLOBALS, LOGGER
+
+GEOSTORE_FEATURES_PREFIX = "geotrellis/features/geostore"
+GEOSTORE_FEATURES_EXTENSIONS = (".tsv", ".tsv.gz", ".parquet")
+COMPACTED_FEATURES_PREFIX = "geotrellis/features/geostore_compacted"
+COMPACTED_FEATURES_PARTS_PREFIX = f"{COMPACTED_FEATURES_PREFIX}/parts"
+COMPACTED_FEATURES_MANIFEST_KEY = f"{COMPACTED_FEATURES_PREFIX}/manifest.json"
+FEATURES_MANIFEST_PREFIX = "geotrellis/features/geostore_manifest"
+FEATURES_INDEX_PREFIX = "geotrellis/features/geostore_index"
+FEATURES_IDS_PREFIX = "geotrellis/features/geostore_ids"
+TSV_HEADER = "geostore_id\tgeom\ttcl\tglad\ttile_id\n"
+PARQUET_AVAILABLE = pa is not None
+GEOPARQUET_METADATA = {
+    "version": "1.0.0",
+    "primary_column": "geom",
+    "columns": {
+        "geom": {"encoding": "WKB", "geometry_types": ["Polygon", "MultiPolygon"]}
+    },
+}
+
+
+def get_features_manifest_path(features_src: str) -> str:
+    """
+    Path of the per geostore cost manifest of a user area features file, with
+    tile count, vertices, clipped area and bytes of each geostore
+    """
+    bucket, key = get_s3_path_parts(features_src)
+    return get_s3_path(
+        bucket, f"{FEATURES_MANIFEST_PREFIX}/{os.path.basename(key)}.json"
+    )
+
+
+def list_geostore_features() -> List[str]:
+    """
+    Keys of the nightly user area features files
+    """
+    keys: List[str] = []
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=GLOBALS.s3_bucket_pipeline, Prefix=f"{GEOSTORE_FEATURES_PREFIX}/"
+    ):
+        keys += [
+            obj["Key"]
+            for obj in page.get("Contents", [])
+            if obj["Key"].endswith(GEOSTORE_FEATURES_EXTENSIONS)
+        ]
+
+    return keys
+
+
+def get_compacted_features_manifest() -> Optional[Dict[str, Any]]:
+    """
+    Manifest of the compacted user area features, with the nightly files merged
+    into them and their parts. Returns None if features were never compacted.
+    """
+    try:
+        response = get_s3_client().get_object(
+            Bucket=GLOBALS.s3_bucket_pipeline, Key=COMPACTED_FEATURES_MANIFEST_KEY
+        )
+    except ClientError as e:
+        if is_missing_object_error(e):
+            return None
+        raise
+
+    return json.loads(response["Body"].read())
+
+
+def get_compacted_features_src(manifest: Dict[str, Any]) -> str:
+    """
+    Glob matching only the compacted parts of the manifest. Parts rewritten since,
+    or not yet published, are in the same folder.
+    """
+    names = [os.path.basename(part["src"]) for part in manifest["parts"]]
+    pattern = names[0] if len(names) == 1 else f"{{{','.join(names)}}}"
+    return get_s3_path(
+        GLOBALS.s3_bucket_pipeline, f"{COMPACTED_FEATURES_PARTS_PREFIX}/{pattern}"
+    )
+
+
+def get_compacted_features_size(features_src: str) -> Optional[int]:
+    """
+    Size of the compacted user area features as TSV, from their manifest. Returns
+    None if the path isn't the glob of the compacted parts.
+    """
+    _, key = get_s3_path_parts(features_src)
+    if os.path.dirname(key) != COMPACTED_FEATURES_PARTS_PREFIX:
+        return None
+
+    manifest = get_compacted_features_manifest()
+    if manifest is None:
+        return None
+
+    return manifest["totals"]["bytes"]
+
+
+def get_features_path(path: str, features_format: str) -> str:
+    path += f".{features_format}"
+    if features_format == "tsv" and GLOBALS.rw_areas_compress_features:
+        path += ".gz"
+    return path
+
+
+def write_features_sidecars(features_src: str, tsv: "TileSortedWriter") -> None:
+    """
+    Write the tile index and the geostore ID list of a features file
+    """
+    _, index_key = get_s3_path_parts(get_features_index_path(features_src))
+    get_s3_client().put_object(
+        Body=json.dumps(tsv.index).encode("utf-8"),
+        Bucket=GLOBALS.s3_bucket_pipeline,
+        Key=index_key,
+    )
+    # lets the postprocessor mark areas as saved without reading the features
+    _, ids_key = get_s3_path_parts(get_features_ids_path(features_src))
+    get_s3_client().put_object(
+        Body=gzip.compress(
+            "".join(f"{i}\n" for i in sorted(tsv.geostore_ids)).encode("utf-8")
+        ),
+        Bucket=GLOBALS.s3_bucket_pipeline,
+        Key=ids_key,
+    )
+
+
+def iter_features_rows(key: str) -> Iterator[bytes]:
+    """
+    Rows of a features file as TSV, without header. Rows of files written before
+    tile IDs were added get their tile ID from the geometry.
+    """
+    if key.endswith(".parquet") and not PARQUET_AVAILABLE:
+        raise RuntimeError(f"Reading GeoParquet features needs pyarrow: {key}")
+
+    body = get_s3_client().get_object(Bucket=GLOBALS.s3_bucket_pipeline, Key=key)[
+        "Body"
+    ]
+    if key.endswith(".parquet"):
+        table = pq.read_table(io.BytesIO(body.read()))
+        columns = [table.column(name).to_pylist() for name in table.column_names]
+        for geostore_id, geom, tcl, glad, tile_id in zip(*columns):
+            yield (
+                f"{geostore_id}\t{geom.hex().upper()}\t{tcl}\t{glad}\t{tile_id}\n"
+            ).encode("utf-8")
+        return
+
+    lines: Iterable[bytes] = (
+        gzip.GzipFile(fileobj=body) if key.endswith(".gz") else body.iter_lines()
+    )
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        if not line or line.startswith(b"geostore_id\t"):
+            continue
+
+        fields = line.split(b"\t")
+        if len(fields) == 4:
+            line += b"\t" + _get_row_tile_id(fields[1].decode("utf-8")).encode("utf-8")
+        yield line + b"\n"
+
+
+def _get_row_tile_id(geom: str) -> str:
+    # rows are clipped to their tile, so it is the tile around the top left corner
+    left, _, _, top = loads(bytes.fromhex(geom)).bounds
+    left, top = math.floor(left + 1e-9), math.ceil(top - 1e-9)
+    return get_tile_id(box(left, top - 1, left + 1, top))
+
+
+def get_features_index_path(features_src: str) -> str:
+    """
+    Path of the per tile row index of a features file. Indexes are kept out of the
+    features folder, so they don't match the features glob.
+    """
+    bucket, key = get_s3_path_parts(features_src)
+    return get_s3_path(bucket, f"{FEATURES_INDEX_PREFIX}/{os.path.basename(key)}.json")
+
+
+def get_features_ids_path(features_src: str) -> str:
+    """
+    Path of the gzipped, newline delimited list of unique geostore IDs in a
+    features file
+    """
+    bucket, key = get_s3_path_parts(features_src)
+    return get_s3_path(bucket, f"{FEATURES_IDS_PREFIX}/{os.path.basename(key)}.txt.gz")
+
+
+def get_features_format() -> str:
+    if GLOBALS.rw_areas_features_format != "parquet":
+        return GLOBALS.rw_areas_features_format
+
+    if not GLOBALS.rw_areas_parquet_enabled:
+        LOGGER.warning(
+            "Geotrellis can't read GeoParquet features until RW_AREAS_PARQUET_ENABLED "
+            "is set, writing TSV."
+        )
+        return "tsv"
+    if not PARQUET_AVAILABLE:
+        LOGGER.warning("Writing features as GeoParquet needs pyarrow, writing TSV.")
+        return "tsv"
+
+    return "parquet"
+
+
+def get_features_writer(
+    upload: io.IOBase, features_format: str
+) -> ContextManager[io.IOBase]:
+    if features_format == "parquet":
+        return ParquetFeaturesWriter(upload)
+    elif GLOBALS.rw_areas_compress_features:
+        return gzip.GzipFile(fileobj=upload, mode="wb")
+
+    return nullcontext(upload)
+
+
+class _FeaturesRowWriter(io.RawIOBase):
+    """
+    Writable file object receiving a features TSV and handling it row by row.
+    Nothing is written if the writer is left with an exception. Closing it with a
+    row missing its newline raises a ValueError.
+    """
+
+    def __init__(self, fileobj: io.IOBase):
+        super().__init__()
+        self._fileobj = fileobj
+        # pieces of the row being received, joined once its newline arrives
+        self._partial_row: List[bytes] = []
+        self._header: Optional[bytes] = None
+        self._failed = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        rows = bytes(b).split(b"\n")
+        if len(rows) > 1:
+            rows[0] = b"".join(self._partial_row + [rows[0]])
+            self._partial_row = []
+        if rows[-1]:
+            self._partial_row.append(rows[-1])
+
+        for row in rows[:-1]:
+            if self._header is None:
+                self._header = row + b"\n"
+            else:
+                self._write_row(row + b"\n")
+
+        return len(b)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        try:
+            if not self._failed:
+                if self._partial_row:
+                    partial_row = b"".join(self._partial_row)
+                    raise ValueError(
+                        f"Features TSV ends with a partial row: {partial_row[:100]!r}"
+                    )
+                self._finish()
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._failed = exc_type is not None
+        self.close()
+
+    @abc.abstractmethod
+    def _write_row(self, row: bytes) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _finish(self) -> None:
+        ...
+
+
+class TileSortedWriter(_FeaturesRowWriter):
+    """
+    Sorts features TSV rows by tile ID, keeping the order of rows within a tile.
+    Rows are spooled to /tmp and written sorted on close, after which index holds
+    [first row, row count, byte offset, byte length] of each tile, with offsets into
+    the uncompressed TSV. geostore_ids holds the unique geostore IDs of all rows.
+    """
+
+    def __init__(self, fileobj: io.IOBase):
+        super().__init__(fileobj)
+        self.index: Dict[str, List[int]] = {}
+        self.geostore_ids: Set[str] = set()
+        self._spool = tempfile.TemporaryFile(dir="/tmp")
+        # offset and length of the spooled rows of each tile
+        self._tiles: Dict[bytes, array] = {}
+
+    def _write_row(self, row: bytes) -> None:
+        tile_id = row[row.rindex(b"\t") + 1 : -1]
+        self.geostore_ids.add(row[: row.index(b"\t")].decode("utf-8"))
+        self._tiles.setdefault(tile_id, array("q")).extend(
+            (self._spool.tell(), len(row))
+        )
+        self._spool.write(row)
+
+    def _finish(self) -> None:
+        offset: int = 0
+        first_row: int = 0
+        if self._header is not None:
+            self._fileobj.write(self._header)
+            offset = len(self._header)
+
+        for tile_id in sorted(self._tiles):
+            rows = self._tiles.pop(tile_id)
+            length: int = 0
+            for row_offset, row_length in zip(rows[::2], rows[1::2]):
+                self._spool.seek(row_offset)
+                length += self._fileobj.write(self._spool.read(row_length))
+
+            row_count = len(rows) // 2
+            self.index[tile_id.decode("utf-8")] = [first_row, row_count, offset, length]
+            first_row += row_count
+            offset += length
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._spool.close()
+
+
+class ParquetFeaturesWriter(_FeaturesRowWriter):
+    """
+    Converts features TSV rows to GeoParquet, with binary WKB geometries and
+    boolean tcl and glad columns. Rows are expected sorted by tile, and each tile is
+    written as one row group.
+    """
+
+    SCHEMA = (
+        pa.schema(
+            [
+                ("geostore_id", pa.string()),
+                ("geom", pa.binary()),
+                ("tcl", pa.bool_()),
+                ("glad", pa.bool_()),
+                ("tile_id", pa.string()),
+            ],
+            metadata={"geo": json.dumps(GEOPARQUET_METADATA)},
+        )
+        if PARQUET_AVAILABLE
+        else None
+    )
+
+    def __init__(self, fileobj: io.IOBase):
+        super().__init__(fileobj)
+        self._writer: Optional["pq.ParquetWriter"] = None
+        self._tile_id: Optional[str] = None
+        self._rows: List[Tuple[str, bytes, bool, bool, str]] = []
+
+    def _write_row(self, row: bytes) -> None:
+        geostore_id, geom, tcl, glad, tile_id = row.decode("utf-8")[:-1].split("\t")
+        if tile_id != self._tile_id:
+            self._write_row_group()
+            self._tile_id = tile_id
+
+        self._rows.append(
+            (geostore_id, bytes.fromhex(geom), tcl == "True", glad == "True", tile_id)
+        )
+
+    def _write_row_group(self) -> None:
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._fileobj, self.SCHEMA)
+        if self._rows:
+            columns = [pa.array(column) for column in zip(*self._rows)]
+            self._writer.write_table(pa.Table.from_arrays(columns, schema=self.SCHEMA))
+            self._rows = []
+
+    def _finish(self) -> None:
+        self._write_row_group()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def get_aoi_geostore_ids(aoi_src: str) -> Set[str]:
+    """
+    Unique geostore IDs of a features file, read from its ID list. Features files
+    written without one are streamed instead.
+    """
+    ids_bucket, ids_key = get_s3_path_parts(get_features_ids_path(aoi_src))
+    try:
+        body = get_s3_client().get_object(Bucket=ids_bucket, Key=ids_key)["Body"]
+    except ClientError as e:
+        if not is_missing_object_error(e):
+            raise
+
+        LOGGER.info(f"No geostore ID list for {aoi_src}, reading features file")
+        return _read_aoi_geostore_ids(aoi_src)
+
+    return {
+        line.strip().decode("utf-8")
+        for line in gzip.GzipFile(fileobj=body)
+        if line.strip()
+    }
+
+
+def _read_aoi_geostore_ids(aoi_src: str) -> Set[str]:
+    geostore_ids = set()
+    aoi_bucket, aoi_key = get_s3_path_parts(aoi_src)
+    if aoi_key.endswith(".parquet") and not PARQUET_AVAILABLE:
+        raise RuntimeError(f"Reading GeoParquet features needs pyarrow: {aoi_src}")
+
+    body = get_s3_client().get_object(Bucket=aoi_bucket, Key=aoi_key)["Body"]
+    if aoi_key.endswith(".parquet"):
+        # parquet needs random access, only the geostore ID column is decoded
+        table = pq.read_table(io.BytesIO(body.read()), columns=["geostore_id"])
+        return set(table.column("geostore_id").to_pylist())
+
+    # features files are gzipped when RW_AREAS_COMPRESS_FEATURES is set
+    rows: Iterable[bytes] = (
+        gzip.GzipFile(fileobj=body) if aoi_key.endswith(".gz") else body.iter_lines()
+    )
+
+    first = True
+    for row in rows:
+        geostore_id = row.split(b"\t")[0].strip().decode("utf-8")
+        if first:
+            first = False
+        elif geostore_id:
+            geostore_ids.add(geostore_id)
+
+    return geostore_ids
+
+
+def get_tile_id(tile: Polygon) -> str:
+    """
+    GFW tile ID of a 1x1 tile, named after its top left corner, e.g. 10N_020E
+    """
+    left, _, _, top = (round(c) for c in tile.bounds)
+    lat = f"{abs(top):02}{'N' if top >= 0 else 'S'}"
+    lon = f"{abs(left):03}{'E' if left >= 0 else 'W'}"
+    return f"{lat}_{lon}"
@@ -1,6 +1,8 @@
 import json
 import pprint
+import time
 import traceback
+from datetime import datetime
 from pprint import pformat
 from typing import Any, Dict, List, Union
 from uuid import uuid1
@@ -11,14 +13,17 @@ from pydantic.error_wrappers import ValidationError
 from datapump.clients.data_api import DataApiClient
 from datapump.clients.datapump_store import DatapumpStore
 from datapump.commands.analysis import FIRES_ANALYSES, AnalysisCommand
+from datapump.commands.compact_features import CompactFeaturesCommand
 from datapump.commands.continue_jobs import ContinueJobsCommand
 from datapump.commands.set_latest import SetLatestCommand
 from datapump.commands.sync import SyncCommand
 from datapump.commands.version_update import RasterVersionUpdateCommand
-from datapump.globals import LOGGER
+from datapump.globals import GLOBALS, LOGGER
 from datapump.jobs.geotrellis import FireAlertsGeotrellisJob, GeotrellisJob
 from datapump.jobs.jobs import Job, JobStatus
 from datapump.jobs.version_update import RasterVersionUpdateJob
+from datapump.sync.rw_areas import expire_cache
+from datapump.sync.rw_areas_compact import compact_features
 from datapump.sync.sync import Syncer
 from datapump.util.slack import slack_webhook
 from datapump.util.util import log_and_notify_error
@@ -33,6 +38,7 @@ def handler(event, context):
                 SyncCommand,
                 ContinueJobsCommand,
                 SetLatestCommand,
+                CompactFeaturesCommand,
             ],
             event,
         )
@@ -54,11 +60,13 @@ def handler(event, context):
         elif isinstance(command, RasterVersionUpdateCommand):
             jobs += _raster_version_update(command)
         elif isinstance(command, SyncCommand):
-            jobs += _sync(command)
+            jobs += _sync(command, context)
         elif isinstance(command, ContinueJobsCommand):
             jobs += command.parameters.dict()["jobs"]
         elif isinstance(command, SetLatestCommand):
             _set_latest(command, client)
+        elif isinstance(command, CompactFeaturesCommand):
+            _compact_features(command)
 
         LOGGER.info(f"Dispatching jobs:\n{pformat(jobs)}")
         return {"jobs": jobs}
@@ -118,9 +126,15 @@ def _raster_version_update(command: RasterVersionUpdateCommand):
     return [job.dict()]
 
 
-def _sync(command: SyncCommand):
+def _sync(command: SyncCommand, context):
     jobs = []
-    syncer = Syncer(command.parameters.types, command.parameters.sync_version)
+    # stop tiling user areas early enough to write their features before timing out
+    deadline = (
+        time.monotonic()
+        + context.get_remaining_time_in_millis() / 1000
+        - GLOBALS.rw_areas_time_margin
+    )
+    syncer = Syncer(command.parameters.types, command.parameters.sync_version, deadline)
     config_client = DatapumpStore()
 
     for sync_type in command.parameters.types:
@@ -152,3 +166,12 @@ def _set_latest(command: SetLatestCommand, data_api_client: DataApiClient):
 
         for ds in analysis_datasets:
             data_api_client.set_latest(ds, row.analysis_version)
+
+
+def _compact_features(command: CompactFeaturesCommand):
+    version = command.parameters.version or f"v{datetime.now().strftime('%Y%m%d')}"
+    features_src = compact_features(version)
+    LOGGER.info(f"Compacted user area features: {features_src}")
+    # the geostore and tile caches are expired here, daily, as the pipelines bucket
+    # has no lifecycle rules for them
+    expire_cache()
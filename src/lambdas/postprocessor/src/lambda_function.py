@@ -11,7 +11,12 @@ from datapump.globals import GLOBALS, LOGGER
 from datapump.jobs.geotrellis import FireAlertsGeotrellisJob, GeotrellisJob
 from datapump.jobs.jobs import Job, JobStatus
 from datapump.jobs.version_update import RasterVersionUpdateJob
-from datapump.sync.rw_areas import get_aoi_geostore_ids
+from datapump.util.features import (
+    get_aoi_geostore_ids,
+    get_features_ids_path,
+    get_features_index_path,
+    get_features_manifest_path,
+)
 from datapump.util.util import log_and_notify_error
 from pydantic import parse_obj_as
 
@@ -100,9 +105,7 @@ def handler(event, context):
 
         if rw_area_jobs:
             # delete AOI tsv file to rollback from failed update
-            LOGGER.info(f"Rolling back AOI input file: {rw_area_jobs[0].features_1x1}")
-            bucket, key = get_s3_path_parts(rw_area_jobs[0].features_1x1)
-            get_s3_client().delete_object(Bucket=bucket, Key=key)
+            _rollback_features(rw_area_jobs[0].features_1x1)
 
         log_and_notify_error(msg)
         raise Exception("One or more jobs failed. See logs for details.")
@@ -117,3 +120,16 @@ def handler(event, context):
                 f"Exception while trying to update user area statuses: {traceback.format_exc()}"
             )
             raise Exception("One or more jobs failed. See logs for details.")
+
+
+def _rollback_features(features_1x1: str) -> None:
+    """Delete the features file of a failed update, with its sidecar files"""
+    LOGGER.info(f"Rolling back AOI input file: {features_1x1}")
+    for path in (
+        features_1x1,
+        get_features_index_path(features_1x1),
+        get_features_manifest_path(features_1x1),
+        get_features_ids_path(features_1x1),
+    ):
+        bucket, key = get_s3_path_parts(path)
+        get_s3_client().delete_object(Bucket=bucket, Key=key)
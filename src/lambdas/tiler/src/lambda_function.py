@@ -0,0 +1,9 @@
+from pprint import pformat
+
+from datapump.globals import LOGGER
+from datapump.sync.rw_areas import tile_chunk
+
+
+def handler(event, context):
+    LOGGER.info(f"Tiling user areas: {pformat(event['start'])}")
+    return tile_chunk(event)
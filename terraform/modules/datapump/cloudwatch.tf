@@ -47,6 +47,16 @@ resource "aws_cloudwatch_event_target" "sync-areas" {
   count     = var.environment == "production" ? 1 : 0
 }
 
+# Runs after the user areas sync, so the compacted features cover its features file
+resource "aws_cloudwatch_event_target" "compact-areas" {
+  rule      = aws_cloudwatch_event_rule.everyday-3-am-est.name
+  target_id = substr("${local.project}-compact-areas${local.name_suffix}", 0, 64)
+  arn       = aws_sfn_state_machine.datapump.id
+  input     = "{\"command\": \"compact_features\", \"parameters\": {}}"
+  role_arn  = aws_iam_role.datapump_states.arn
+  count     = var.environment == "production" ? 1 : 0
+}
+
 resource "aws_cloudwatch_event_target" "sync-deforestation-alerts" {
   rule      = aws_cloudwatch_event_rule.everyday-7-pm-est.name
   target_id = substr("${local.project}-sync-deforestation-alerts${local.name_suffix}", 0, 64)
@@ -9,6 +9,10 @@ resource "aws_lambda_function" "dispatcher" {
   timeout          = var.lambda_params.timeout
   publish          = true
   tags             = local.tags
+  # compacting user area features sorts them in /tmp
+  ephemeral_storage {
+    size = 10240
+  }
   layers           = [
     module.py310_datapump_021.layer_arn,
     var.numpy_lambda_layer_arn,
@@ -24,6 +28,7 @@ resource "aws_lambda_function" "dispatcher" {
       DATAPUMP_TABLE_NAME           = aws_dynamodb_table.datapump.name
       S3_GLAD_PATH                  = var.glad_path
       GCS_KEY_SECRET_ARN            = var.gcs_secret_arn
+      RW_AREAS_TILING_FUNCTION      = aws_lambda_function.tiler.function_name
     }
   }
 }
@@ -82,4 +87,31 @@ resource "aws_lambda_function" "postprocessor" {
       DATAPUMP_TABLE_NAME            = aws_dynamodb_table.datapump.name
     }
   }
-}
\ No newline at end of file
+}
+
+resource "aws_lambda_function" "tiler" {
+  function_name    = substr("${local.project}-tiler${local.name_suffix}", 0, 64)
+  filename         = data.archive_file.lambda_tiler.output_path
+  source_code_hash = data.archive_file.lambda_tiler.output_base64sha256
+  role             = aws_iam_role.datapump_lambda.arn
+  runtime          = var.lambda_params.runtime
+  handler          = "lambda_function.handler"
+  memory_size      = var.lambda_params.memory_size
+  timeout          = var.lambda_params.timeout
+  publish          = true
+  tags             = local.tags
+  layers           = [
+    module.py310_datapump_021.layer_arn,
+    var.numpy_lambda_layer_arn,
+    var.rasterio_lambda_layer_arn,
+    var.shapely_lambda_layer_arn
+  ]
+  environment {
+    variables = {
+      ENV                            = var.environment
+      DATA_API_URI                   = var.data_api_uri
+      S3_BUCKET_PIPELINE             = var.pipelines_bucket
+      S3_BUCKET_DATA_LAKE            = var.data_lake_bucket
+    }
+  }
+}
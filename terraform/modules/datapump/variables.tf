@@ -130,4 +130,4 @@ variable "read_gfw_sync_secrets_policy" {
   type        = string
   default     = ""
   description = "ARN to policy to read gfw sync secrets"
-}
\ No newline at end of file
+}
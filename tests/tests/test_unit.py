@@ -1,21 +1,47 @@
 #############
 ## Test some specific code paths without having to test the entire step function
 #############
+import gzip
+import hashlib
+import io
+import json
+import math
+import multiprocessing
 import os
+import shutil
 import time
-from datetime import date, datetime, timedelta
+import zipfile
+from datetime import date, datetime, timedelta, timezone
 from typing import List
+from urllib.parse import parse_qs, urlparse
 
 import pytest
+import retry.api  # type: ignore[import]
+import shapefile
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+from shapely import wkb
+from shapely.geometry import (
+    GeometryCollection,
+    LineString,
+    MultiPolygon,
+    Point,
+    Polygon,
+    box,
+    mapping,
+)
 
 os.environ["S3_BUCKET_PIPELINE"] = "gfw-pipelines-test"
 os.environ["S3_BUCKET_DATA_LAKE"] = "gfw-data-lake-test"
 os.environ["GEOTRELLIS_JAR_PATH"] = "s3://gfw-pipelines-test/geotrellis/jars"
 
 import datapump.sync.sync as sync
+from datapump.clients import aws, rw_api
+from datapump.clients.data_api import DataApiClient
 from datapump.clients.datapump_store import DatapumpConfig
 from datapump.commands.analysis import Analysis, AnalysisInputTable
 from datapump.commands.sync import SyncType
+from datapump.jobs import geotrellis
 from datapump.jobs.geotrellis import (
     FireAlertsGeotrellisJob,
     GeotrellisJob,
@@ -23,12 +49,15 @@ from datapump.jobs.geotrellis import (
     JobStatus,
 )
 from datapump.jobs.version_update import RasterVersionUpdateJob
+from datapump.sync import fire_alerts, rw_areas, rw_areas_compact
 from datapump.sync.sync import (
     DeforestationAlertsSync,
     GLADLAlertsSync,
     GLADS2AlertsSync,
     RADDAlertsSync,
 )
+from datapump.util import features
+from datapump.util.exceptions import UnexpectedResponseError
 
 
 def test_geotrellis_fires():
@@ -122,6 +151,67 @@ def test_geotrellis_retries(monkeypatch):
     assert test.status == JobStatus.failed
 
 
+def test_geotrellis_rw_areas_worker_count(monkeypatch, s3_client):
+    features_1x1 = "s3://gfw-pipelines-test/geotrellis/features/geostore/v1.tsv"
+    test = GeotrellisJob(
+        id="test",
+        status=JobStatus.starting,
+        analysis_version="vtest",
+        sync_version="vtestsync",
+        sync_type=SyncType.rw_areas,
+        table=AnalysisInputTable(
+            dataset="geostore", version="vtestds", analysis=Analysis.glad
+        ),
+        features_1x1=features_1x1,
+        geotrellis_version="1.3.0",
+    )
+
+    def partition_count(worker_count):
+        spark = test._configurations(worker_count)[1]["Properties"]
+        return int(spark["spark.sql.shuffle.partitions"])
+
+    # without a manifest, use the fixed worker count
+    assert test._calculate_worker_count(features_1x1) == 30
+    assert partition_count(30) == 30 * 7 * 3
+
+    def write_manifest(tiles, vertices, area):
+        s3_client.objects[
+            "geotrellis/features/geostore_manifest/v1.tsv.json"
+        ] = json.dumps(
+            {"totals": {"tiles": tiles, "vertices": vertices, "area": area}}
+        ).encode()
+
+    write_manifest(12, 1000, 0.1)
+    assert test._calculate_worker_count(features_1x1) == 10
+    assert partition_count(10) == 70
+
+    write_manifest(50_000, 10_000_000, 100)
+    assert test._calculate_worker_count(features_1x1) == 70
+    assert partition_count(70) == 70 * 7 * 3
+
+    write_manifest(500_000, 100_000_000, 1000)
+    assert test._calculate_worker_count(features_1x1) == 100
+
+    # glad only reads the rows in its extent
+    s3_client.objects["geotrellis/features/geostore_manifest/v1.tsv.json"] = json.dumps(
+        {
+            "totals": {
+                "tiles": 500_000,
+                "vertices": 100_000_000,
+                "area": 1000,
+                "bytes": 10**9,
+                "glad_tiles": 12,
+                "glad_vertices": 1000,
+                "glad_area": 0.1,
+                "glad_bytes": 10**4,
+            }
+        }
+    ).encode()
+    assert test._calculate_worker_count(features_1x1) == 10
+    assert partition_count(10) == 70
+    assert "--glad" in test._get_step()["HadoopJarStep"]["Args"]
+
+
 def test_radd_sync_nothing_newer(monkeypatch):
     mock_dp_config = DatapumpConfig(
         analysis_version="v20220101",
@@ -523,6 +613,1316 @@ def test_glad_landsat_sync_grown_extent(monkeypatch):
         _ = GLADLAlertsSync("v20220222").build_jobs(mock_dp_config)
 
 
+def test_fire_alerts_in_memory_shapefile(monkeypatch, tmp_path, s3_client):
+    shp, shx, dbf = io.BytesIO(), io.BytesIO(), io.BytesIO()
+    writer = shapefile.Writer(shp=shp, shx=shx, dbf=dbf, shapeType=shapefile.POINT)
+    for field in ["ACQ_TIME", "CONFIDENCE"]:
+        writer.field(field, "C", 10)
+    for field in ["BRIGHTNESS", "BRIGHT_T31", "FRP"]:
+        writer.field(field, "N", 10, 2)
+    writer.field("ACQ_DATE", "D")
+    for i, (acq_date, acq_time) in enumerate(
+        [
+            (date(2024, 1, 2), "0130"),
+            (date(2024, 1, 1), "2300"),
+            (date(2024, 1, 2), "0005"),
+        ]
+    ):
+        writer.point(10 + i, -5 - i)
+        writer.record(acq_time, "n", 300 + i, 290 + i, 1.5 + i, acq_date)
+    writer.close()
+
+    zip_content = io.BytesIO()
+    with zipfile.ZipFile(zip_content, "w", zipfile.ZIP_DEFLATED) as zip:
+        for member, content in [("shp", shp), ("shx", shx), ("dbf", dbf)]:
+            zip.writestr(f"MODIS_C6_1_Global_7d.{member}", content.getvalue())
+    zip_content = zip_content.getvalue()
+
+    class MockResponse:
+        status_code = 200
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def iter_content(self, chunk_size):
+            for i in range(0, len(zip_content), 100):
+                yield zip_content[i : i + 100]
+
+    prefix = "nasa_modis_fire_alerts/v6/vector/epsg-4326/tsv/near_real_time"
+    s3_client.put_object(
+        Body=b"",
+        Bucket="gfw-data-lake-test",
+        Key=f"{prefix}/2024-01-01-1200_2024-01-01-2200.tsv",
+    )
+    monkeypatch.setattr(fire_alerts, "TEMP_DIR", str(tmp_path))
+    monkeypatch.setattr(fire_alerts, "ZIP_MAX_MEMORY", 1000)
+    monkeypatch.setattr(fire_alerts.requests, "get", lambda url, stream: MockResponse())
+
+    uri, last_date = fire_alerts.process_active_fire_alerts("modis")
+
+    key = f"{prefix}/2024-01-01-2300_2024-01-02-0130.tsv"
+    assert uri == f"s3a://gfw-data-lake-test/{key}"
+    assert last_date == "2024-01-02"
+    assert s3_client.objects[key].decode("utf-8").splitlines() == [
+        "latitude\tlongitude\tacq_date\tacq_time\tconfidence\tbrightness\tbright_t31\tfrp",
+        "-6.0\t11.0\t2024-01-01\t2300\tn\t301.0\t291.0\t2.5",
+        "-7.0\t12.0\t2024-01-02\t0005\tn\t302.0\t292.0\t3.5",
+        "-5.0\t10.0\t2024-01-02\t0130\tn\t300.0\t290.0\t1.5",
+    ]
+    # nothing is extracted, only the result TSV is written
+    assert os.listdir(tmp_path) == ["fire_alerts_modis.tsv"]
+
+
+def test_rw_areas_intersecting_tiles(extent_1x1):
+    tile_index = rw_areas._get_tile_index(extent_1x1)
+
+    for geom in [
+        box(-0.5, -0.5, 0.5, 0.5),
+        box(1, 1, 2, 2),
+        box(0.2, 0.2, 0.3, 0.3),
+        box(-10, -10, 10, 10),
+        box(2.5, 2.5, 5, 5),
+        box(10, 10, 11, 11),
+    ]:
+        expected = [
+            (*tile, geom.contains(tile[0]))
+            for tile in extent_1x1
+            if geom.intersects(tile[0])
+        ]
+        assert (
+            rw_areas._get_intersecting_tiles(geom, extent_1x1, tile_index) == expected
+        )
+
+
+def test_rw_areas_parallel_tiling(extent_1x1):
+    tile_index = rw_areas._get_tile_index(extent_1x1)
+    geostores = [
+        _geostore(f"{i:032d}", box(-2 + i * 0.3, -2, -1 + i * 0.5, i * 0.4))
+        for i in range(7)
+    ]
+    geostores.insert(3, _geostore("invalid_type", box(0, 0, 1, 1).boundary))
+
+    serial = rw_areas._tile_geostores(geostores, extent_1x1, tile_index)
+    parallel = rw_areas._tile_geostores(geostores, extent_1x1, tile_index, 3)
+
+    assert parallel == serial
+    error_ids = [error_id for _, error_id in parallel]
+    assert error_ids == [None, None, None, "invalid_type", None, None, None, None]
+    assert all(rows for rows, error_id in parallel if not error_id)
+
+
+def test_rw_areas_parallel_tiling_failure(monkeypatch, extent_1x1):
+    def mock_tile_geostore_batch(geostores, *args):
+        if geostores[0]["geostoreId"] == "dies":
+            os._exit(1)
+        time.sleep(60)
+
+    monkeypatch.setattr(rw_areas, "_tile_geostore_batch", mock_tile_geostore_batch)
+    geostores = [
+        _geostore("dies", box(0, 0, 1, 1)),
+        _geostore("hangs", box(0, 0, 1, 1)),
+    ]
+
+    # a worker which dies fails tiling, and the others are stopped
+    start = time.monotonic()
+    with pytest.raises(EOFError):
+        rw_areas._tile_geostores(geostores, extent_1x1, {}, 2)
+    assert time.monotonic() - start < 30
+    assert not multiprocessing.active_children()
+
+
+def test_rw_areas_contained_tiles(extent_1x1):
+    tile_index = rw_areas._get_tile_index(extent_1x1)
+    geom = box(-2.5, -1.5, 2.5, 2.5)
+
+    tiles = rw_areas._get_intersecting_tiles(geom, extent_1x1, tile_index)
+    assert len(tiles) == 30
+    assert sum(contained for *_, contained in tiles) == 12
+
+    rows, error_id = rw_areas._tile_geostore(
+        _geostore("contained", geom), extent_1x1, tile_index
+    )
+    assert error_id is None
+    assert len(rows) == 30
+
+    clipped = [wkb.loads(row.split("\t")[1], hex=True) for row in rows]
+    assert sum(polygon.area for polygon in clipped) == pytest.approx(geom.area)
+
+
+@pytest.mark.skipif(
+    not rw_areas.VECTORIZED_TILING_AVAILABLE, reason="vectorized tiling needs shapely 2"
+)
+def test_rw_areas_vectorized_tiling(extent_1x1):
+    tile_index = rw_areas._get_tile_index(extent_1x1)
+    geostores = [
+        _geostore("contained", box(-2.5, -1.5, 2.5, 2.5)),
+        _geostore("invalid_type", box(0, 0, 1, 1).boundary),
+        _geostore("outside", box(10, 10, 11, 11)),
+        _geostore(
+            "collection",
+            MultiPolygon([box(0.2, 0.2, 0.8, 0.8), box(1, 0.2, 1.5, 0.8)]),
+        ),
+        _geostore("ring", box(-2, -2, 2, 2).difference(box(-1.5, -1.5, 1.5, 1.5))),
+    ]
+
+    scalar = rw_areas._tile_geostores(geostores, extent_1x1, tile_index)
+    vectorized = rw_areas._tile_geostores(
+        geostores, extent_1x1, tile_index, vectorized=True
+    )
+
+    assert vectorized == scalar
+    assert [error_id for _, error_id in vectorized] == [
+        None,
+        "invalid_type",
+        None,
+        None,
+        None,
+    ]
+    assert not vectorized[2][0]
+
+
+def test_rw_areas_polygonal_intersection():
+    polygon = box(0, 0, 1, 1)
+    line = LineString([(1, 0), (1, 1)])
+
+    assert rw_areas._get_polygonal(polygon) == polygon
+    assert rw_areas._get_polygonal(line) is None
+    assert rw_areas._get_polygonal(GeometryCollection([polygon, line])) == polygon
+    assert rw_areas._get_polygonal(
+        GeometryCollection([polygon, box(2, 2, 3, 3), line])
+    ) == MultiPolygon([polygon, box(2, 2, 3, 3)])
+    assert rw_areas._get_polygonal(GeometryCollection([line])) is None
+
+
+def test_rw_areas_extent_1x1_cache(monkeypatch, tmp_path, s3_client):
+    extent_geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": mapping(box(x, y, x + 1, y + 1)),
+                "properties": {"tcl": True, "glad": x < 0},
+            }
+            for y in range(2, -2, -1)
+            for x in range(-2, 2)
+        ],
+    }
+
+    s3_client.put_object(
+        Body=json.dumps(extent_geojson).encode(),
+        Bucket="gfw-pipelines-test",
+        Key=rw_areas.EXTENT_1X1_KEY,
+    )
+    monkeypatch.setattr(rw_areas, "EXTENT_1X1_CACHE", str(tmp_path / "extent.npz"))
+
+    extent_1x1, etag = rw_areas._get_extent_1x1()
+    assert s3_client.downloads == 1
+    assert len(extent_1x1) == 16
+    assert extent_1x1[0][0].equals(box(-2, 2, -1, 3))
+    assert extent_1x1[0][1:] == (True, True)
+    assert extent_1x1[-1][1:] == (True, False)
+
+    assert rw_areas._get_extent_1x1() == (extent_1x1, etag)
+    assert s3_client.downloads == 1
+
+    extent_geojson["features"] = extent_geojson["features"][1:]
+    s3_client.put_object(
+        Body=json.dumps(extent_geojson).encode(),
+        Bucket="gfw-pipelines-test",
+        Key=rw_areas.EXTENT_1X1_KEY,
+    )
+    new_extent_1x1, new_etag = rw_areas._get_extent_1x1()
+    assert s3_client.downloads == 2
+    assert new_etag != etag
+    assert new_extent_1x1 == extent_1x1[1:]
+
+    # a truncated or corrupt cache is rebuilt
+    for corrupt in [
+        (tmp_path / "extent.npz").read_bytes()[:100],
+        b"not a cache",
+    ]:
+        (tmp_path / "extent.npz").write_bytes(corrupt)
+        assert rw_areas._get_extent_1x1() == (new_extent_1x1, new_etag)
+        assert rw_areas._read_extent_1x1_cache(new_etag) == new_extent_1x1
+    assert s3_client.downloads == 4
+
+
+def test_rw_areas_geostore_cache(monkeypatch, tmp_path, s3_client):
+    requested_ids = []
+
+    def mock_find_geostores_by_ids(geostore_ids):
+        requested_ids.append(geostore_ids)
+        return {"data": [_geostore(i, box(0, 0, 1, 1)) for i in geostore_ids]}
+
+    monkeypatch.setattr(rw_areas, "_find_geostores_by_ids", mock_find_geostores_by_ids)
+    monkeypatch.setattr(rw_areas, "CACHE_DIR", str(tmp_path / "local"))
+
+    ids = [f"{i:032x}" for i in range(3)]
+    geostores = rw_areas.get_geostore(ids[:2])
+    assert requested_ids == [ids[:2]]
+    assert [g["geostoreId"] for g in geostores["data"]] == ids[:2]
+    assert len(s3_client.objects) == 2
+
+    geostores = rw_areas.get_geostore(ids)
+    assert requested_ids[-1] == ids[2:]
+    assert [g["geostoreId"] for g in geostores["data"]] == ids
+    assert geostores["data"][0] == json.loads(
+        json.dumps(_geostore(ids[0], box(0, 0, 1, 1)))
+    )
+
+    # S3 layer is used when the local cache is gone, e.g. on a cold Lambda
+    shutil.rmtree(tmp_path / "local")
+    geostores = rw_areas.get_geostore(ids)
+    assert requested_ids[-1] == []
+    assert [g["geostoreId"] for g in geostores["data"]] == ids
+
+    # the least recently used objects are evicted from the local cache over its size
+    def local_files():
+        return sorted(
+            path.name.split(".")[0]
+            for path in (tmp_path / "local").rglob("*")
+            if path.is_file()
+        )
+
+    assert local_files() == ids
+    object_size = max(
+        path.stat().st_size for path in (tmp_path / "local").rglob("*.json.gz")
+    )
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_local_cache_size", 3 * object_size)
+    rw_areas.get_geostore(ids[:1])
+    more_ids = [f"{i:032x}" for i in range(3, 5)]
+    rw_areas.get_geostore(more_ids)
+    assert local_files() == [ids[0], *more_ids]
+
+
+def test_rw_areas_tile_cache(monkeypatch, tmp_path, extent_1x1, s3_client):
+    tiled_ids = []
+
+    def mock_tile_geostores(geostores, *args):
+        tiled_ids.append([g["geostoreId"] for g in geostores])
+        return rw_areas._tile_geostore_batch(geostores, extent_1x1, tile_index, False)
+
+    monkeypatch.setattr(rw_areas, "CACHE_DIR", str(tmp_path / "local"))
+    monkeypatch.setattr(rw_areas, "_get_extent_1x1", lambda: (extent_1x1, '"e1"'))
+    monkeypatch.setattr(rw_areas, "_tile_geostores", mock_tile_geostores)
+    monkeypatch.setattr(rw_areas, "update_area_statuses", lambda ids, status: None)
+
+    tile_index = rw_areas._get_tile_index(extent_1x1)
+    geostores = [
+        _geostore(f"{i:032x}", box(-2 + i * 0.3, -2, -1 + i * 0.5, i * 0.4))
+        for i in range(4)
+    ]
+    geostores.append(_geostore("invalid_type", box(0, 0, 1, 1).boundary))
+
+    def tile(geostores):
+        rows = io.StringIO()
+        count = rw_areas._write_tiled_geostores(
+            rw_areas._tile_geostores_with_cache(
+                geostores, extent_1x1, tile_index, rw_areas._get_tiling_version('"e1"')
+            ),
+            rows.write,
+        )
+        return rows.getvalue(), count
+
+    first_tsv, _ = tile(geostores[:2])
+    tsv, count = tile(geostores)
+
+    ids = [g["geostoreId"] for g in geostores]
+    assert tiled_ids == [ids[:2], ids[2:]]
+    assert tsv.startswith(first_tsv)
+    assert count == len(tsv.splitlines())
+    # geometries which can't be tiled aren't cached
+    assert len(s3_client.objects) == 4
+
+    assert tile(geostores) == (tsv, count)
+    assert tiled_ids[-1] == ["invalid_type"]
+
+    # tiles of other tiling versions and objects past their expiration are deleted
+    cached = sorted(s3_client.objects)
+    old_version = cached[0].replace(rw_areas._get_tiling_version('"e1"'), "v1/e0")
+    s3_client.objects[old_version] = b""
+    expired_key = rw_areas._get_geostore_cache_key("a" * 32)
+    fresh_key = rw_areas._get_geostore_cache_key("b" * 32)
+    s3_client.objects[expired_key] = s3_client.objects[fresh_key] = b""
+    s3_client.last_modified[expired_key] = datetime.now(timezone.utc) - timedelta(
+        days=91
+    )
+    assert rw_areas.expire_cache() == 2
+    assert sorted(s3_client.objects) == sorted(cached + [fresh_key])
+
+
+def test_rw_areas_duplicate_geometries(monkeypatch, tmp_path, extent_1x1, s3_client):
+    tiled_ids = []
+
+    def mock_tile_geostores(geostores, *args):
+        tiled_ids.append([g["geostoreId"] for g in geostores])
+        return rw_areas._tile_geostore_batch(geostores, extent_1x1, tile_index, False)
+
+    monkeypatch.setattr(rw_areas, "CACHE_DIR", str(tmp_path / "local"))
+    monkeypatch.setattr(rw_areas, "_tile_geostores", mock_tile_geostores)
+
+    tile_index = rw_areas._get_tile_index(extent_1x1)
+    geom = box(-1.5, -1.5, 1.5, 0.5)
+    geostores = [
+        _geostore("a" * 32, geom),
+        _geostore("b" * 32, box(0, 0, 1, 1)),
+        # same geometry, starting from another vertex and in the other direction
+        _geostore("c" * 32, Polygon(geom.exterior.coords[::-1][1:])),
+        _geostore("d" * 32, geom),
+    ]
+
+    results = rw_areas._tile_geostores_with_cache(
+        geostores, extent_1x1, tile_index, "v1"
+    )
+    assert tiled_ids == [["a" * 32, "b" * 32]]
+    assert [error_id for _, error_id in results] == [None] * 4
+    assert len(results[0][0]) == 12
+    for (rows, _), g in zip(results, geostores):
+        assert all(row.startswith(g["geostoreId"]) for row in rows)
+    assert [row[32:] for row in results[3][0]] == [row[32:] for row in results[0][0]]
+    assert results[2][0] == [row.replace("a", "c", 32) for row in results[0][0]]
+
+    # duplicates in later runs are found in the cache
+    cached_results = rw_areas._tile_geostores_with_cache(
+        [_geostore("e" * 32, geom)], extent_1x1, tile_index, "v1"
+    )
+    assert tiled_ids[-1] == []
+    assert cached_results[0][0] == [row.replace("a", "e", 32) for row in results[0][0]]
+
+
+def test_rw_areas_simplify_geometry(monkeypatch):
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_max_vertices", 1000)
+    tolerance = rw_areas.GLOBALS.rw_areas_max_simplify_tolerance
+
+    small = Point(0, 0).buffer(1, 16)
+    assert rw_areas._simplify_geometry(small, "small") is small
+
+    # a wiggly ring with many vertices closer together than the tolerance
+    coords = [
+        (
+            (1 + 0.00005 * (i % 2)) * math.cos(2 * math.pi * i / 20000),
+            (1 + 0.00005 * (i % 2)) * math.sin(2 * math.pi * i / 20000),
+        )
+        for i in range(20000)
+    ]
+    large = MultiPolygon([Polygon(coords), box(5, 5, 6, 6)])
+    simplified = rw_areas._simplify_geometry(large, "large")
+    assert rw_areas._get_vertex_count(large) == 20006
+    assert rw_areas._get_vertex_count(simplified) <= 1000
+    assert simplified.is_valid
+    assert large.hausdorff_distance(simplified) <= tolerance
+
+    version = rw_areas._get_tiling_version('"e1"')
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_max_vertices", None)
+    assert rw_areas._simplify_geometry(large, "large") is large
+    assert rw_areas._get_tiling_version('"e1"') != version
+
+
+def test_rw_areas_geometry_repair(monkeypatch):
+    buffered = []
+
+    def spy_buffer_geometry(geom):
+        buffered.append(geom)
+        return buffer_geometry(geom)
+
+    buffer_geometry = rw_areas._buffer_geometry
+    monkeypatch.setattr(rw_areas, "_buffer_geometry", spy_buffer_geometry)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_geometry_repair", "make_valid")
+
+    # a spike along one edge, make_valid drops it
+    spike = Polygon([(0, 0), (2, 0), (2, 2), (1, 2), (1, 3), (1, 2), (0, 2)])
+    geom, error_id = rw_areas._get_clean_geometry(_geostore("spike", spike))
+    assert error_id is None
+    assert geom.is_valid and geom.equals(box(0, 0, 2, 2))
+    assert not buffered
+
+    bowtie = Polygon([(0, 0), (1, 1), (1, 0), (0, 1)])
+    geom, error_id = rw_areas._get_clean_geometry(_geostore("bowtie", bowtie))
+    assert error_id is None
+    assert geom.is_valid and geom.area == pytest.approx(0.5, abs=0.001)
+    assert len(buffered) == 1
+
+    # a thin hole is closed by the double buffer
+    sliver = box(0, 0, 1, 1).difference(box(0.2, 0.5, 0.8, 0.50001))
+    geom, error_id = rw_areas._get_clean_geometry(_geostore("sliver", sliver))
+    assert error_id is None
+    assert len(buffered) == 2
+    assert not geom.interiors
+
+    # separate parts are kept as they are, parts with a narrow gap are joined
+    islands = MultiPolygon([box(0, 0, 1, 1), box(2, 0, 3, 1), box(0, 2, 1, 3)])
+    geom, error_id = rw_areas._get_clean_geometry(_geostore("islands", islands))
+    assert error_id is None
+    assert len(buffered) == 2
+    assert geom.equals(islands)
+
+    gap = MultiPolygon([box(0, 0, 1, 1), box(1.00005, 0, 2, 1), box(0, 2, 1, 3)])
+    geom, error_id = rw_areas._get_clean_geometry(_geostore("gap", gap))
+    assert error_id is None
+    assert len(buffered) == 3
+    assert len(geom.geoms) == 2
+
+    # a thin hole in one part of a multipolygon
+    holed = MultiPolygon([sliver, box(2, 0, 3, 1)])
+    geom, error_id = rw_areas._get_clean_geometry(_geostore("holed", holed))
+    assert error_id is None
+    assert len(buffered) == 4
+    assert not any(polygon.interiors for polygon in geom.geoms)
+
+    # holes up to twice the sliver width are closed by the double buffer
+    narrow_hole = box(0, 0, 1, 1).difference(box(0.5, 0.2, 0.50015, 0.8))
+    assert rw_areas._has_slivers(narrow_hole)
+    assert not rw_areas._has_slivers(
+        box(0, 0, 1, 1).difference(box(0.5, 0.2, 0.5003, 0.8))
+    )
+
+    # without shapely 2, parts are compared pairwise
+    monkeypatch.setattr(rw_areas, "VECTORIZED_TILING_AVAILABLE", False)
+    assert not rw_areas._has_slivers(islands)
+    assert rw_areas._has_slivers(gap)
+
+    # geometries still invalid after repair are set to error by their geostore ID
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_geometry_repair", "buffer")
+    monkeypatch.setattr(rw_areas, "_buffer_geometry", lambda geom: bowtie)
+    assert rw_areas._get_clean_geometry(_geostore("invalid", box(0, 0, 1, 1))) == (
+        None,
+        "invalid",
+    )
+
+
+def test_rw_areas_write_1x1_tsv(monkeypatch, tmp_path, extent_1x1, s3_client):
+    geostores = {
+        f"{i:032x}": _geostore(f"{i:032x}", box(-2 + i * 0.3, -2, -1 + i * 0.2, 1))
+        for i in range(5)
+    }
+    requested_ids = []
+
+    def mock_find_geostores_by_ids(geostore_ids):
+        requested_ids.append(geostore_ids)
+        return {"data": [geostores[i] for i in geostore_ids]}
+
+    monkeypatch.setattr(rw_areas, "CACHE_DIR", str(tmp_path / "local"))
+    monkeypatch.setattr(rw_areas, "_get_extent_1x1", lambda: (extent_1x1, '"e1"'))
+    monkeypatch.setattr(rw_areas, "_find_geostores_by_ids", mock_find_geostores_by_ids)
+    monkeypatch.setattr(rw_areas, "update_area_statuses", lambda ids, status: None)
+    pending_requests = []
+    saved = set()
+    monkeypatch.setattr(
+        rw_areas,
+        "get_pending_areas",
+        lambda: pending_requests.append(1)
+        or [
+            {"id": i, "attributes": {"geostore": i}}
+            for i in reversed(geostores)
+            if i not in saved
+        ],
+    )
+    monkeypatch.setattr(rw_areas, "slack_webhook", lambda level, message: None)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_chunk_size", 2)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_tiling_workers", 1)
+
+    # the time budget runs out after the first chunk, which is written
+    time_checks = []
+    monkeypatch.setattr(
+        rw_areas,
+        "_out_of_time",
+        lambda *_: time_checks.append(1) or len(time_checks) > 1,
+    )
+    tsv = io.BytesIO()
+    costs = {}
+    first_count = rw_areas.write_1x1_tsv(tsv, costs)
+    assert requested_ids == [list(geostores)[:2]]
+    assert set(costs) == set(list(geostores)[:2])
+    checkpoint = json.loads(s3_client.objects[rw_areas.CHECKPOINT_KEY])
+    assert checkpoint["next"] == 2 and len(checkpoint["chunks"]) == 1
+
+    # once written, the checkpoint only keeps the geostores left to tile
+    chunk_key = checkpoint["chunks"][0]["key"]
+    rw_areas._drop_merged_chunks()
+    checkpoint = json.loads(s3_client.objects[rw_areas.CHECKPOINT_KEY])
+    assert checkpoint["geostore_ids"] == list(geostores)[2:]
+    assert checkpoint["next"] == 0 and not checkpoint["chunks"]
+    assert chunk_key not in s3_client.objects
+
+    # the next run resumes from the checkpoint, with areas pending since
+    saved.update(list(geostores)[:2])
+    geostores[f"{5:032x}"] = _geostore(f"{5:032x}", box(-2, 0, -1.5, 0.5))
+    monkeypatch.setattr(rw_areas, "_out_of_time", lambda *_: False)
+    count = first_count + rw_areas.write_1x1_tsv(tsv, costs)
+    assert sorted(i for ids in requested_ids for i in ids) == sorted(geostores)
+    assert len(pending_requests) == 2
+
+    tile_index = rw_areas._get_tile_index(extent_1x1)
+    expected = [
+        row
+        for g in geostores.values()
+        for row in rw_areas._tile_geostore(g, extent_1x1, tile_index)[0]
+    ]
+    lines = tsv.getvalue().decode("utf-8").splitlines(keepends=True)
+    assert lines.pop(first_count + 1) == features.TSV_HEADER
+    assert count == len(lines) - 1
+    assert lines[0] == features.TSV_HEADER
+    assert sorted(lines[1:]) == sorted(expected)
+    assert set(costs) == set(geostores)
+    assert sum(cost["tiles"] for cost in costs.values()) == count
+    assert sum(cost["bytes"] for cost in costs.values()) == sum(
+        len(line) for line in lines[1:]
+    )
+    assert math.isclose(
+        costs[f"{0:032x}"]["area"],
+        geostores[f"{0:032x}"]["geostore"]["data"]["attributes"]["areaHa"] / 1_000_000,
+    )
+
+    # the costs of the rows in each extent are totaled too
+    glad_lines = [line for line in lines[1:] if line.split("\t")[3] == "True"]
+    assert 0 < len(glad_lines) < count
+    totals = rw_areas._get_cost_totals(costs)
+    assert totals["tiles"] == count
+    assert totals["glad_tiles"] == len(glad_lines)
+    assert totals["glad_bytes"] == sum(len(line) for line in glad_lines)
+
+    rw_areas._delete_checkpoint()
+    assert not any(
+        key.startswith(rw_areas.CHECKPOINT_PREFIX) for key in s3_client.objects
+    )
+
+
+def test_rw_areas_fanout_tiling(monkeypatch, tmp_path, extent_1x1, s3_client):
+    now = time.monotonic()
+    assert not rw_areas._out_of_time(now + 60)
+    assert rw_areas._out_of_time(now + 60, 120)
+
+    geostores = {
+        f"{i:032x}": _geostore(f"{i:032x}", box(-2 + i * 0.3, -2, -1 + i * 0.2, 1))
+        for i in range(5)
+    }
+
+    monkeypatch.setattr(rw_areas, "CACHE_DIR", str(tmp_path / "local"))
+    monkeypatch.setattr(rw_areas, "_get_extent_1x1", lambda: (extent_1x1, '"e1"'))
+    monkeypatch.setattr(
+        rw_areas,
+        "_find_geostores_by_ids",
+        lambda geostore_ids: {"data": [geostores[i] for i in geostore_ids]},
+    )
+    monkeypatch.setattr(rw_areas, "update_area_statuses", lambda ids, status: None)
+    monkeypatch.setattr(
+        rw_areas,
+        "get_pending_areas",
+        lambda: [{"id": i, "attributes": {"geostore": i}} for i in geostores],
+    )
+    monkeypatch.setattr(rw_areas, "slack_webhook", lambda level, message: None)
+    monkeypatch.setattr(rw_areas, "_out_of_time", lambda *_: False)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_chunk_size", 2)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_tiling_workers", 1)
+
+    expected = io.BytesIO()
+    expected_costs = {}
+    rw_areas.write_1x1_tsv(expected, expected_costs)
+    rw_areas._delete_checkpoint()
+
+    # without a tiling function, chunks are tiled in process one at a time
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_fanout_workers", 2)
+    checkpoints = []
+    write_checkpoint = rw_areas._write_checkpoint
+    monkeypatch.setattr(
+        rw_areas,
+        "_write_checkpoint",
+        lambda checkpoint: checkpoints.append(json.loads(json.dumps(checkpoint)))
+        or write_checkpoint(checkpoint),
+    )
+    tsv = io.BytesIO()
+    costs = {}
+    rw_areas.write_1x1_tsv(tsv, costs)
+    assert [checkpoint["next"] for checkpoint in checkpoints] == [0, 2, 4, 5]
+    assert tsv.getvalue() == expected.getvalue()
+    assert costs == expected_costs
+    rw_areas._delete_checkpoint()
+
+    # with one, two chunks at a time by invoking it, recorded in order. Waves are
+    # only started if the longest so far fits before the deadline
+    checkpoints.clear()
+    wave_durations = []
+    monkeypatch.setattr(
+        rw_areas,
+        "_out_of_time",
+        lambda deadline, expected_duration: wave_durations.append(expected_duration)
+        or False,
+    )
+    invocations = []
+
+    class MockLambdaClient:
+        def invoke(self, FunctionName, InvocationType, Payload):
+            shard = json.loads(Payload)
+            invocations.append((FunctionName, shard["start"]))
+            assert shard["settings"]["rw_areas_max_vertices"] is None
+            if shard["start"] == 4 and len(invocations) > 3:
+                body = json.dumps({"errorMessage": "Task timed out"}).encode()
+                return {
+                    "FunctionError": "Unhandled",
+                    "Payload": StreamingBody(io.BytesIO(body), len(body)),
+                }
+            # workers tile with the dispatcher's settings, not their own
+            monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_max_vertices", 4)
+            body = json.dumps(rw_areas.tile_chunk(shard)).encode()
+            return {"Payload": StreamingBody(io.BytesIO(body), len(body))}
+
+    monkeypatch.setattr(rw_areas, "get_lambda_client", lambda: MockLambdaClient())
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_tiling_function", "tiler")
+    tsv = io.BytesIO()
+    rw_areas.write_1x1_tsv(tsv)
+    assert sorted(invocations) == [("tiler", 0), ("tiler", 2), ("tiler", 4)]
+    assert [checkpoint["next"] for checkpoint in checkpoints] == [0, 4, 5]
+    assert [chunk["key"].rsplit("/", 1)[1] for chunk in checkpoints[-1]["chunks"]] == [
+        "0000000.tsv.gz",
+        "0000002.tsv.gz",
+        "0000004.tsv.gz",
+    ]
+    assert wave_durations[0] == 0 and wave_durations[1] > 0
+    assert tsv.getvalue() == expected.getvalue()
+    rw_areas._delete_checkpoint()
+
+    # a worker which keeps failing is invoked again for halves of its chunk, down to
+    # single geostores, which are set to error. The other chunks are merged still
+    errors = []
+    monkeypatch.setattr(
+        rw_areas,
+        "update_area_statuses",
+        lambda ids, status: status == "error" and errors.extend(ids),
+    )
+    tsv = io.BytesIO()
+    assert rw_areas.write_1x1_tsv(tsv) > 0
+    assert errors == [f"{4:032x}"]
+    checkpoint = json.loads(s3_client.objects[rw_areas.CHECKPOINT_KEY])
+    assert checkpoint["next"] == 5 and len(checkpoint["chunks"]) == 2
+    assert tsv.getvalue().decode("utf-8").splitlines() == [
+        line
+        for line in expected.getvalue().decode("utf-8").splitlines()
+        if not line.startswith(f"{4:032x}")
+    ]
+
+    # the next run budgets its first wave by the longest chunk tiled so far
+    checkpoint["next"] = 4
+    rw_areas._write_checkpoint(checkpoint)
+    wave_durations.clear()
+    rw_areas.write_1x1_tsv(io.BytesIO())
+    assert wave_durations[0] > 0
+    assert wave_durations[0] == max(chunk["duration"] for chunk in checkpoint["chunks"])
+    rw_areas._delete_checkpoint()
+
+
+def test_rw_areas_tiling_failures(monkeypatch, tmp_path, extent_1x1, s3_client):
+    geostores = {
+        f"{i:032x}": _geostore(f"{i:032x}", box(-2 + i * 0.3, -2, -1 + i * 0.2, 1))
+        for i in range(6)
+    }
+    geostore_ids = list(geostores)
+
+    monkeypatch.setattr(rw_areas, "CACHE_DIR", str(tmp_path / "local"))
+    monkeypatch.setattr(rw_areas, "_get_extent_1x1", lambda: (extent_1x1, '"e1"'))
+    monkeypatch.setattr(
+        rw_areas,
+        "_find_geostores_by_ids",
+        lambda geostore_ids: {"data": [geostores[i] for i in geostore_ids]},
+    )
+    errors = []
+    monkeypatch.setattr(
+        rw_areas,
+        "update_area_statuses",
+        lambda ids, status: status == "error" and errors.extend(ids),
+    )
+    monkeypatch.setattr(
+        rw_areas,
+        "get_pending_areas",
+        lambda: [{"id": i, "attributes": {"geostore": i}} for i in geostores],
+    )
+    monkeypatch.setattr(rw_areas, "slack_webhook", lambda level, message: None)
+    monkeypatch.setattr(rw_areas, "_out_of_time", lambda *_: False)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_chunk_size", 4)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_tiling_workers", 1)
+
+    broken = {geostore_ids[1]} | set(geostore_ids[3:])
+    tile_geostore = rw_areas._tile_geostore
+
+    def mock_tile_geostore(g, *args):
+        if g["geostoreId"] in broken:
+            raise ValueError("TopologyException")
+        return tile_geostore(g, *args)
+
+    monkeypatch.setattr(rw_areas, "_tile_geostore", mock_tile_geostore)
+
+    # once several geostores fail in a row, tiling gives up without setting those
+    # to error, and the chunks tiled before are merged
+    tsv = io.BytesIO()
+    assert rw_areas.write_1x1_tsv(tsv) > 0
+    assert errors == [geostore_ids[1]]
+    checkpoint = json.loads(s3_client.objects[rw_areas.CHECKPOINT_KEY])
+    assert checkpoint["next"] == 3 and len(checkpoint["chunks"]) == 2
+    lines = tsv.getvalue().decode("utf-8").splitlines()[1:]
+    assert {line.split("\t")[0] for line in lines} == {
+        geostore_ids[0],
+        geostore_ids[2],
+    }
+    rw_areas._delete_checkpoint()
+
+    # a geostore which always fails is set to error, and the others are tiled
+    errors.clear()
+    broken.difference_update(geostore_ids[3:])
+    tsv = io.BytesIO()
+    count = rw_areas.write_1x1_tsv(tsv)
+    assert errors == [geostore_ids[1]]
+    checkpoint = json.loads(s3_client.objects[rw_areas.CHECKPOINT_KEY])
+    assert checkpoint["next"] == 6
+    lines = tsv.getvalue().decode("utf-8").splitlines()[1:]
+    assert count == len(lines)
+    assert {line.split("\t")[0] for line in lines} == set(geostores) - broken
+    rw_areas._delete_checkpoint()
+
+
+def test_multipart_upload_writer(monkeypatch, s3_client):
+    data = os.urandom(25)
+    with aws.MultipartUploadWriter("bucket", "large", part_size=10) as upload:
+        for i in range(0, len(data), 3):
+            upload.write(data[i : i + 3])
+        assert len(s3_client.uploads["upload0"]) == 2
+    assert s3_client.objects["large"] == data
+    assert not s3_client.uploads
+
+    with aws.MultipartUploadWriter("bucket", "small", part_size=10) as upload:
+        upload.write(data[:5])
+    assert s3_client.objects["small"] == data[:5]
+
+    with pytest.raises(ValueError):
+        with aws.MultipartUploadWriter("bucket", "failed", part_size=10) as upload:
+            upload.write(data)
+            raise ValueError()
+    assert "failed" not in s3_client.objects
+    assert not s3_client.uploads
+
+
+def test_rw_areas_features_writer_small_writes():
+    rows = [
+        features.TSV_HEADER,
+        "a\t" + "01" * 5000 + "\tTrue\tFalse\t01N_001E\n",
+        "b\tgeom\tTrue\tFalse\t00N_000E\n",
+    ]
+    data = "".join(rows).encode("utf-8")
+
+    fileobj = io.BytesIO()
+    with features.TileSortedWriter(fileobj) as writer:
+        for i in range(0, len(data), 7):
+            writer.write(data[i : i + 7])
+    assert fileobj.getvalue() == "".join(rows[0:1] + rows[2:] + rows[1:2]).encode()
+
+
+def test_rw_areas_features_writer_partial_row():
+    fileobj = io.BytesIO()
+    writer = features.TileSortedWriter(fileobj)
+    writer.write(features.TSV_HEADER.encode("utf-8"))
+    writer.write(b"a\tgeom\tTrue\tFalse\t00N_000E\nb\tgeom")
+    with pytest.raises(ValueError, match="partial row"):
+        writer.close()
+    assert writer.closed
+    assert fileobj.getvalue() == b""
+
+
+@pytest.mark.parametrize(
+    "features_format, compress, extension",
+    [("tsv", False, ".tsv"), ("tsv", True, ".tsv.gz"), ("parquet", True, ".parquet")],
+)
+def test_rw_areas_create_1x1_tsv(
+    monkeypatch, features_format, compress, extension, s3_client
+):
+    if features_format == "parquet":
+        pytest.importorskip("pyarrow")
+
+    # two tiles per geostore, written geostore by geostore
+    rows = [features.TSV_HEADER] + [
+        f"{i:032x}\t{wkb.dumps(box(x, 0, x + 0.5, 0.5), hex=True)}\t{x == 1}\tFalse"
+        f"\t01N_00{x}E\n"
+        for i in range(3)
+        for x in range(2)
+    ]
+    sorted_rows = [rows[0]] + sorted(rows[1:], key=lambda row: row[-9:])
+    assert features.get_tile_id(box(20, 9, 21, 10)) == "10N_020E"
+    assert features.get_tile_id(box(-21, -11, -20, -10)) == "10S_021W"
+
+    def mock_write_1x1_tsv(tsv, costs, deadline):
+        for row in rows:
+            tsv.write(row.encode("utf-8"))
+            if row != features.TSV_HEADER:
+                rw_areas._add_row_cost(costs, row)
+        return len(rows) - 1
+
+    monkeypatch.setattr(rw_areas, "write_1x1_tsv", mock_write_1x1_tsv)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_features_format", features_format)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_parquet_enabled", True)
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_compress_features", compress)
+
+    path = rw_areas.create_1x1_tsv("v20240101")
+    assert path.endswith(extension)
+    with monkeypatch.context() as m:
+        # parquet is only written once Geotrellis can read it
+        m.setattr(rw_areas.GLOBALS, "rw_areas_parquet_enabled", False)
+        assert features.get_features_format() == "tsv"
+    ids_key = "geotrellis/features/geostore_ids/" + path.split("/")[-1] + ".txt.gz"
+    assert gzip.decompress(s3_client.objects[ids_key]) == "".join(
+        f"{i:032x}\n" for i in range(3)
+    ).encode("utf-8")
+    assert features.get_aoi_geostore_ids(path) == {f"{i:032x}" for i in range(3)}
+
+    # features files without an ID list are read instead
+    ids = s3_client.objects.pop(ids_key)
+    assert features.get_aoi_geostore_ids(path) == {f"{i:032x}" for i in range(3)}
+    s3_client.objects[ids_key] = ids
+
+    index = json.loads(
+        s3_client.objects[
+            "geotrellis/features/geostore_index/" + path.split("/")[-1] + ".json"
+        ]
+    )
+    assert index == {
+        "01N_000E": [0, 3, len(rows[0]), sum(len(row) for row in sorted_rows[1:4])],
+        "01N_001E": [
+            3,
+            3,
+            sum(len(row) for row in sorted_rows[:4]),
+            sum(len(row) for row in sorted_rows[4:]),
+        ],
+    }
+
+    if features_format == "tsv" and not compress:
+        tsv = s3_client.objects[path.split("/", 3)[3]]
+        assert tsv == "".join(sorted_rows).encode("utf-8")
+        offset, length = index["01N_001E"][2:]
+        assert tsv[offset : offset + length] == "".join(sorted_rows[4:]).encode()
+
+    if features_format == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(io.BytesIO(s3_client.objects[path.split("/", 3)[3]]))
+        assert b"geo" in parquet.schema_arrow.metadata
+        assert parquet.num_row_groups == 2
+        table = parquet.read()
+        assert table.column("tcl").to_pylist() == [False] * 3 + [True] * 3
+        assert [wkb.loads(g) for g in table.column("geom").to_pylist()] == [
+            wkb.loads(row.split("\t")[1], hex=True) for row in sorted_rows[1:]
+        ]
+
+    manifest = json.loads(
+        s3_client.objects[
+            "geotrellis/features/geostore_manifest/" + path.split("/")[-1] + ".json"
+        ]
+    )
+    assert manifest["geostores"][f"{0:032x}"] == {
+        "tiles": 2,
+        "vertices": 10,
+        "area": 0.5,
+        "bytes": len(rows[1]) + len(rows[2]),
+        "tcl_tiles": 1,
+        "tcl_vertices": 5,
+        "tcl_area": 0.25,
+        "tcl_bytes": len(rows[2]),
+    }
+    assert manifest["totals"] == {
+        "geostores": 3,
+        "tiles": 6,
+        "vertices": 30,
+        "area": 1.5,
+        "bytes": sum(len(row) for row in rows[1:]),
+        "tcl_tiles": 3,
+        "tcl_vertices": 15,
+        "tcl_area": 0.75,
+        "tcl_bytes": sum(len(row) for row in rows[2::2]),
+        "glad_tiles": 0,
+        "glad_vertices": 0,
+        "glad_area": 0.0,
+        "glad_bytes": 0,
+    }
+
+    monkeypatch.setattr(rw_areas, "write_1x1_tsv", lambda tsv, costs, deadline: 0)
+    assert rw_areas.create_1x1_tsv("v20240102") is None
+    assert len(s3_client.objects) == 4
+
+
+def test_rw_areas_read_parquet_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(features, "PARQUET_AVAILABLE", False)
+
+    with pytest.raises(RuntimeError, match="needs pyarrow"):
+        next(features.iter_features_rows("geotrellis/features/geostore/a.parquet"))
+    with pytest.raises(RuntimeError, match="needs pyarrow"):
+        features._read_aoi_geostore_ids("s3://bucket/geotrellis/features/a.parquet")
+
+
+def test_rw_areas_compact_features(monkeypatch, s3_client):
+    def row(geostore_id, x, tile_id=True):
+        geom = wkb.dumps(box(x, -0.5, x + 0.5, 0), hex=True)
+        tile = f"\t00N_00{x}E" if tile_id else ""
+        return f"{geostore_id * 32}\t{geom}\tTrue\tFalse{tile}\n"
+
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_compress_features", False)
+    prefix = "geotrellis/features/geostore"
+    # files written before tile IDs were added have no tile ID column
+    s3_client.objects[f"{prefix}/v20240101.tsv"] = (
+        "geostore_id\tgeom\ttcl\tglad\n"
+        + row("a", 1, False)
+        + row("b", 0, False)
+        + row("b", 1, False)
+    ).encode()
+    s3_client.objects[f"{prefix}/v20240102.tsv.gz"] = gzip.compress(
+        (features.TSV_HEADER + row("b", 1) + row("c", 0)).encode()
+    )
+
+    # a run compacts the oldest files first, the others are left for the next runs
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_compacted_max_sources", 1)
+    rw_areas_compact.compact_features("v20240103")
+    manifest = features.get_compacted_features_manifest()
+    assert manifest["sources"] == [f"{prefix}/v20240101.tsv"]
+    assert (
+        DataApiClient()
+        .get_1x1_asset("geostore", "v1")
+        .endswith("geostore/*.{tsv*,parquet}")
+    )
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_compacted_max_sources", 30)
+
+    # parts of a failed run, never published
+    parts_prefix = features.COMPACTED_FEATURES_PARTS_PREFIX
+    s3_client.objects[f"{parts_prefix}/v20240102_0001_000.tsv"] = b"orphan"
+
+    path = rw_areas_compact.compact_features("v20240103")
+    part_key = f"{parts_prefix}/v20240103_0001_000.tsv"
+    assert path == f"s3://gfw-pipelines-test/{part_key}"
+    assert f"{parts_prefix}/v20240102_0001_000.tsv" not in s3_client.objects
+    assert DataApiClient().get_1x1_asset("geostore", "v1") == path
+    assert features.get_aoi_geostore_ids(path) == {"a" * 32, "b" * 32, "c" * 32}
+
+    # b is only kept from the newest file, rows are sorted by tile, newest first
+    expected_rows = [row("c", 0), row("b", 1), row("a", 1)]
+    assert s3_client.objects[part_key].decode() == features.TSV_HEADER + "".join(
+        expected_rows
+    )
+    manifest = features.get_compacted_features_manifest()
+    assert manifest["totals"] == {
+        "geostores": 3,
+        "rows": 3,
+        "bytes": sum(len(r) for r in expected_rows),
+    }
+
+    # new nightly files aren't compacted yet, so the nightly files are analyzed
+    s3_client.objects[f"{prefix}/v20240104.tsv"] = (
+        features.TSV_HEADER + row("d", 0) + row("a", 1)
+    ).encode()
+    assert (
+        DataApiClient()
+        .get_1x1_asset("geostore", "v1")
+        .endswith("geostore/*.{tsv*,parquet}")
+    )
+
+    # the open part is merged with the new file into a new part, the replaced part
+    # is kept for jobs still reading it until the next run
+    path = rw_areas_compact.compact_features("v20240104")
+    new_part_key = f"{parts_prefix}/v20240104_0002_000.tsv"
+    assert path == f"s3://gfw-pipelines-test/{new_part_key}"
+    assert part_key in s3_client.objects
+    assert s3_client.objects[new_part_key].decode() == features.TSV_HEADER + "".join(
+        [row("d", 0), row("c", 0), row("a", 1), row("b", 1)]
+    )
+    assert DataApiClient().get_1x1_asset("geostore", "v1") == path
+    assert rw_areas_compact.compact_features("v20240105") == path
+    assert part_key not in s3_client.objects
+
+    # full parts are kept, geostores in them aren't compacted again
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_areas_compacted_part_size", 1)
+    s3_client.objects[f"{prefix}/v20240106.tsv"] = (
+        features.TSV_HEADER + row("e", 1) + row("d", 0)
+    ).encode()
+    rw_areas_compact.compact_features("v20240106")
+    parts = features.get_compacted_features_manifest()["parts"]
+    assert [p["src"].split("/")[-1] for p in parts] == [
+        "v20240104_0002_000.tsv",
+        "v20240106_0003_001.tsv",
+    ]
+    assert s3_client.objects[
+        f"{parts_prefix}/v20240106_0003_001.tsv"
+    ].decode() == features.TSV_HEADER + row("e", 1)
+    s3_client.objects[f"{prefix}/v20240107.tsv"] = (
+        features.TSV_HEADER + row("f", 0) + row("b", 1)
+    ).encode()
+    path = rw_areas_compact.compact_features("v20240107")
+    parts = features.get_compacted_features_manifest()["parts"]
+    assert [p["src"].split("/")[-1] for p in parts] == [
+        "v20240104_0002_000.tsv",
+        "v20240106_0003_001.tsv",
+        "v20240107_0004_002.tsv",
+    ]
+    assert path == (
+        f"s3://gfw-pipelines-test/{parts_prefix}/{{v20240104_0002_000.tsv,"
+        "v20240106_0003_001.tsv,v20240107_0004_002.tsv}"
+    )
+    assert (
+        features.get_compacted_features_size(path)
+        == features.get_compacted_features_manifest()["totals"]["bytes"]
+    )
+    assert s3_client.objects[
+        f"{parts_prefix}/v20240107_0004_002.tsv"
+    ].decode() == features.TSV_HEADER + row("f", 0)
+
+
+def test_rw_areas_pending_areas_pages(monkeypatch):
+    page_count = 7
+    requested_pages = []
+
+    def mock_get(url, headers):
+        query = parse_qs(urlparse(url).query)
+        number = int(query["page[number]"][0])
+        requested_pages.append(number)
+        # later pages answer first, results must still be in page order
+        time.sleep((page_count - number) * 0.01)
+        return MockResponse(
+            200,
+            {
+                "data": [{"id": f"{number}_{i}"} for i in range(2)],
+                "links": {
+                    "self": url,
+                    "last": url.replace(
+                        f"page[number]={number}", f"page[number]={page_count}"
+                    ),
+                },
+            },
+        )
+
+    monkeypatch.setattr(rw_areas, "token", lambda: "token")
+    monkeypatch.setattr(rw_areas.requests, "post", lambda *a, **k: MockResponse(200))
+    monkeypatch.setattr(rw_areas.requests, "get", mock_get)
+
+    # pages are streamed, later pages are only requested once areas are consumed
+    monkeypatch.setattr(rw_areas.GLOBALS, "rw_api_max_workers", 2)
+    areas = rw_areas.get_pending_areas()
+    assert next(areas)["id"] == "1_0"
+    assert requested_pages == [1]
+    areas = [{"id": "1_0"}, *areas]
+    assert [area["id"] for area in areas] == [
+        f"{number}_{i}" for number in range(1, page_count + 1) for i in range(2)
+    ]
+    assert sorted(requested_pages) == list(range(1, page_count + 1))
+
+
+def test_rw_areas_find_geostores_by_ids(monkeypatch):
+    geostore_ids = [f"{i:032x}" for i in range(1000)]
+    poisoned = {geostore_ids[3], geostore_ids[750]}
+    flaky = {geostore_ids[42]}
+    batch_sizes = []
+
+    def mock_post(url, json, headers):
+        batch = json["geostores"]
+        batch_sizes.append(len(batch))
+        if poisoned.intersection(batch):
+            return MockResponse(400)
+        if flaky.intersection(batch):
+            flaky.clear()
+            return MockResponse(503)
+        return MockResponse(200, {"data": [{"geostoreId": i} for i in batch]})
+
+    monkeypatch.setattr(rw_areas, "token", lambda: "token")
+    monkeypatch.setattr(rw_areas.requests, "post", mock_post)
+    monkeypatch.setattr(retry.api.time, "sleep", lambda _: None)
+
+    geostores = rw_areas._find_geostores_by_ids(geostore_ids)
+    assert [g["geostoreId"] for g in geostores["data"]] == [
+        i for i in geostore_ids if i not in poisoned
+    ]
+    # fast and small responses let the batch size grow
+    assert max(batch_sizes) > rw_areas.GEOSTORE_PAGE_SIZE
+
+    poisoned.update(geostore_ids)
+    with pytest.raises(UnexpectedResponseError):
+        rw_areas._find_geostores_by_ids(geostore_ids)
+
+
+def test_update_area_statuses(monkeypatch):
+    geostore_ids = [f"{i:032x}" for i in range(250)]
+    poisoned = {geostore_ids[7], geostore_ids[201]}
+    unavailable = [geostore_ids[100]]
+    updated = []
+
+    def mock_post(url, json, headers):
+        if poisoned.intersection(json["geostores"]):
+            return MockResponse(400)
+        # the chunk with this geostore hits a transient error once
+        if unavailable and unavailable[0] in json["geostores"]:
+            unavailable.clear()
+            return MockResponse(503)
+        assert json["update_params"] == {"status": "saved"}
+        updated.extend(json["geostores"])
+        return MockResponse(200)
+
+    monkeypatch.setattr(rw_api, "token", lambda: "token")
+    monkeypatch.setattr(rw_api, "slack_webhook", lambda level, message: None)
+    monkeypatch.setattr(rw_api.requests, "post", mock_post)
+    monkeypatch.setattr(retry.api.time, "sleep", lambda _: None)
+
+    failed_ids = rw_api.update_area_statuses(geostore_ids, "saved")
+    assert failed_ids == [geostore_ids[7], geostore_ids[201]]
+    assert sorted(updated) == sorted(set(geostore_ids) - poisoned)
+    assert not unavailable
+
+    assert rw_api.update_area_statuses(set(geostore_ids[:3]), "saved") == []
+
+    # server and connection errors are retried, then fail the whole chunk
+    requests = []
+
+    def mock_failing_post(url, json, headers):
+        requests.append(json["geostores"])
+        if len(requests) % 2:
+            return MockResponse(500)
+        raise rw_api.requests.ConnectionError("connection refused")
+
+    monkeypatch.setattr(rw_api.requests, "post", mock_failing_post)
+    assert rw_api.update_area_statuses(geostore_ids, "saved") == geostore_ids
+    assert len(requests) == 3 * rw_api.STATUS_UPDATE_RETRIES
+
+    # chunks aren't split any further once only failures were isolated
+    requests.clear()
+
+    def mock_rejecting_post(url, json, headers):
+        requests.append(json["geostores"])
+        return MockResponse(401)
+
+    monkeypatch.setattr(rw_api.requests, "post", mock_rejecting_post)
+    monkeypatch.setattr(rw_api.GLOBALS, "rw_api_max_workers", 1)
+    assert rw_api.update_area_statuses(geostore_ids, "saved") == geostore_ids
+    assert len(requests) < 30
+
+
+class MockResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    @property
+    def content(self):
+        return json.dumps(self.body).encode("utf-8")
+
+
+@pytest.fixture
+def extent_1x1():
+    """
+    6x6 1x1 degree grid around 0, 0, with GLAD tiles south of the equator
+    """
+    return [
+        (box(x, y, x + 1, y + 1), True, y < 0)
+        for y in range(3, -3, -1)
+        for x in range(-3, 3)
+    ]
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    s3_client = MockS3Client()
+    for client_module in (
+        aws,
+        fire_alerts,
+        features,
+        geotrellis,
+        rw_areas,
+        rw_areas_compact,
+    ):
+        monkeypatch.setattr(client_module, "get_s3_client", lambda: s3_client)
+    return s3_client
+
+
+class MockS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.last_modified = {}
+        self.uploads = {}
+        self.downloads = 0
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ETag": self._etag(Key), "ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        self.downloads += 1
+        body = self.objects[Key]
+        return {
+            "ETag": self._etag(Key),
+            "Body": StreamingBody(io.BytesIO(body), len(body)),
+        }
+
+    def put_object(self, Body, Bucket, Key):
+        self.objects[Key] = Body
+
+    def upload_fileobj(self, Fileobj, Bucket, Key):
+        self.objects[Key] = Fileobj.read()
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.delete_object(Bucket, obj["Key"])
+        return {}
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        now = datetime.now(timezone.utc)
+        return [
+            {
+                "Contents": [
+                    {"Key": key, "LastModified": self.last_modified.get(key, now)}
+                    for key in keys
+                ]
+            }
+        ]
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Body, Bucket, Key, PartNumber, UploadId):
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(
+            parts[part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        del self.uploads[UploadId]
+
+    def _etag(self, key):
+        return f'"{hashlib.md5(self.objects[key]).hexdigest()}"'
+
+
+def _geostore(geostore_id, geom):
+    return {
+        "geostoreId": geostore_id,
+        "geostore": {
+            "data": {
+                "attributes": {
+                    "geojson": {"features": [{"geometry": mapping(geom)}]},
+                    "areaHa": geom.area * 1_000_000,
+                }
+            }
+        },
+    }
+
+
 EXPECTED = {
     "Name": "viirs",
     "ActionOnFailure": "TERMINATE_CLUSTER",